@@ -1,9 +1,15 @@
 import streamlit as st
-from time import sleep
+import atexit
+from time import perf_counter, sleep
 import dotenv
 import os
 import json
-from player import Player
+from player import Player, STATE_FILE, HISTORY_DEPTH
+from player.capture import create_frame_source
+from player.environment import create_environment
+from player.segment_cache import SegmentationCache
+from player.intent import IntentCache
+from player.frames import FrameEncoder, FRAME_FORMAT, FRAME_QUALITY
 from player.types import MoveDirection, TurnDirection
 
 # Load environment variables from .env file
@@ -13,10 +19,51 @@ col1, col2 = st.columns([2, 5])
 placeholder = col2.empty()
 
 if "player" not in st.session_state:
+    knowledge_base = None
+    if os.getenv("MANUAL_DB") and os.getenv("MANUAL_COLLECTION"):
+        from kb.knowledge_base import KnowledgeBase, EMBEDDING_MODEL
+
+        knowledge_base = KnowledgeBase(
+            os.getenv("MANUAL_DB"),
+            os.getenv("EMBEDDING_MODEL", EMBEDDING_MODEL),
+            os.getenv("EMBEDDING_DEVICE", "cpu"),
+        )
     st.session_state["player"] = Player(
-        game_controller_model=os.getenv("GAME_CONTROLLER_MODEL")
+        game_controller_model=os.getenv("GAME_CONTROLLER_MODEL"),
+        frame_source=(
+            create_frame_source(os.getenv("FRAME_SOURCE"))
+            if os.getenv("FRAME_SOURCE")
+            else None
+        ),
+        adaptive_settle=os.getenv("ADAPTIVE_SETTLE", "0") == "1",
+        segment_cache=SegmentationCache(disk_dir=os.getenv("SEGMENT_CACHE_DIR")),
+        pipelined=os.getenv("PIPELINED", "0") == "1",
+        intent_cache=IntentCache(cache_file=os.getenv("INTENT_CACHE_FILE")),
+        knowledge_base=knowledge_base,
+        manual_collection=os.getenv("MANUAL_COLLECTION"),
+        macro=os.getenv("MACRO", "0") == "1",
+        macro_checkpoint=int(os.getenv("MACRO_CHECKPOINT", "0")),
+        history_depth=int(os.getenv("HISTORY_DEPTH", HISTORY_DEPTH)),
+        environment=create_environment(os.getenv("ENVIRONMENT", "pyautogui")),
+        macro_key_delay=(
+            float(os.getenv("MACRO_KEY_DELAY"))
+            if os.getenv("MACRO_KEY_DELAY", "measure") != "measure"
+            else None
+        ),
+    )
+    # the pipeline workers are daemon threads, finish their steps before exiting
+    atexit.register(st.session_state["player"].close)
+    if os.getenv("MACRO_KEY_DELAY") == "measure":
+        player = st.session_state["player"]
+        player.macro_key_delay = player.measure_key_delay()
+        print(f"Measured macro key delay: {player.macro_key_delay} s")
+if "frames" not in st.session_state:
+    st.session_state["frames"] = FrameEncoder(
+        os.getenv("FRAME_FORMAT", FRAME_FORMAT),
+        int(os.getenv("FRAME_QUALITY", FRAME_QUALITY)),
     )
 aPlayer = st.session_state["player"]
+frames = st.session_state["frames"]
 
 col1_controls, col2_controls, col3_controls = col1.columns(3)
 if col1_controls.button("TL"):
@@ -31,6 +78,11 @@ if col2_controls.button("B"):
     aPlayer.move(MoveDirection.BACKWARD)
 if col3_controls.button("R"):
     aPlayer.move(MoveDirection.RIGHT)
+state_file = os.getenv("STATE_FILE", STATE_FILE)
+if col1_controls.button("Save"):
+    aPlayer.save_state(state_file)
+if col2_controls.button("Load"):
+    aPlayer.load_state(state_file)
 
 with col1.form("action_form"):
     user_prompt = st.text_input("What to do?")
@@ -38,22 +90,59 @@ with col1.form("action_form"):
 
 tools_used = st.empty()
 if len(user_prompt) > 0:
-    tools = aPlayer.action_text(user_prompt)
+    tool_errors = len(aPlayer.tool_errors)
+    tools = aPlayer.action_text(
+        user_prompt, stream=os.getenv("STREAM_TOOLS", "0") == "1"
+    )
     with tools_used.container():
         for tool in tools:
             st.write(tool.model_dump_json(indent=2))
+        for error in aPlayer.tool_errors[tool_errors:]:
+            st.warning(f"{error['tool']} {error['arguments']}: {error['error']}")
+        manual_reads = sum(1 for tool in tools if tool.name == "read_manual")
+        if manual_reads > 0:
+            for manual in aPlayer.manual_results[-manual_reads:]:
+                st.write(manual)
     user_prompt = ""
 
 
-@st.experimental_fragment()
+live = col1.toggle("Live view")
+live_fps = col1.slider(
+    "Max FPS", 0.5, 10.0, float(os.getenv("LIVE_FPS", "2")), 0.5, disabled=not live
+)
+
+
+@st.experimental_fragment(run_every=1 / live_fps if live else None)
 def show_state(container):
+    start = perf_counter()
+    aPlayer.sync()
+    step = aPlayer.state.step
     with container.container():
-        st.write(f"Step: {aPlayer.state.step} Direction: {aPlayer.state.direction}")
+        st.write(f"Step: {step} Direction: {aPlayer.state.direction}")
         st.write(f"Coordinates: {aPlayer.state.coordinates}")
-        st.write(aPlayer.screen)
-        st.write(aPlayer.segmentview)
-        st.button("Refresh")
-        st.write(aPlayer.state.segments)
+        if aPlayer.settler is not None:
+            st.write(f"View settle: {aPlayer.settler.stats()}")
+        st.write(f"Segmentation cache: {aPlayer.vision.cache.stats()}")
+        st.write(f"Intents: {aPlayer.smc.intents.stats()}")
+        st.write(f"Inputs and observations: {aPlayer.macro_stats}")
+        st.write(
+            f"History: {len(aPlayer.history)} of {aPlayer.history.total} actions,"
+            f" snapshot ms: {aPlayer.snapshot_ms}"
+        )
+        # unchanged steps reuse the encoded bytes, the browser keeps the media file
+        screen = frames.encode("screen", step, aPlayer.screen)
+        if screen is not None:
+            st.image(screen)
+        segmentview = frames.encode("segments", step, aPlayer.segmentview)
+        if segmentview is not None:
+            st.image(segmentview)
+        if not live:
+            st.button("Refresh")
+        with st.expander(f"Segments ({len(aPlayer.state.segments)})"):
+            st.dataframe(aPlayer.state.segments.to_columns())
+        latency = st.empty()
+    render_ms = (perf_counter() - start) * 1000
+    latency.write(f"Render: {render_ms:.1f} ms, frames: {frames.stats()}")
 
 
 show_state(placeholder)
@@ -0,0 +1,35 @@
+"""
+Frame capture microbenchmark.
+
+python -m bench.capture --sources pyautogui,mss,files:frames/ --frames 200
+"""
+import argparse
+from player.capture import create_frame_source
+from bench.common import measure, summarize, print_table
+
+parser = argparse.ArgumentParser(description="Measure frame capture speed of frame sources")
+parser.add_argument("--sources", type=str, default="pyautogui,mss", help="Comma separated frame source specs")
+parser.add_argument("--frames", type=int, default=200, help="Frames to capture per source")
+parser.add_argument("--region", type=str, default="0,50,640,350", help="Capture region: left,top,width,height")
+
+
+def main():
+    args = parser.parse_args()
+    region = tuple(int(v) for v in args.region.split(","))
+    rows = []
+    for spec in args.sources.split(","):
+        try:
+            source = create_frame_source(spec)
+        except Exception as e:
+            print(f"Skipping {spec}: {e}")
+            continue
+        try:
+            timings = measure(lambda: source.grab(region), args.frames)
+        finally:
+            source.close()
+        rows.append({"source": spec, **summarize(timings)})
+    print_table(rows, ["source", "iterations", "per_second", "p50_ms", "p99_ms"])
+
+
+if __name__ == "__main__":
+    main()
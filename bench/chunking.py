@@ -0,0 +1,67 @@
+"""
+Scaling of KnowledgeBase.embed chunking: streaming chunker vs the old in-place merge.
+
+python -m bench.chunking --pages 10,100,1000
+"""
+import argparse
+import copy
+from time import perf_counter
+from kb.chunker import iter_documents
+from bench.common import print_table, synthetic_manual
+
+parser = argparse.ArgumentParser(description="Benchmark manual chunking")
+parser.add_argument("--pages", type=str, default="10,100,1000", help="Comma separated manual sizes")
+parser.add_argument("--chunk-sentences", type=int, default=10)
+parser.add_argument("--overlap-sentences", type=int, default=5)
+parser.add_argument("--skip-legacy-above", type=int, default=1000, help="Do not run the old chunker on bigger manuals")
+
+
+def legacy_documents(full_text, chunk_sentences, overlap_sentences):
+    """Chunking from KnowledgeBase.embed as it was before kb.chunker"""
+    lines_cnt = len(full_text)
+    i = 0
+    while i < lines_cnt - 1:
+        line_strip = full_text[i]['text'].strip('\n ')
+        while not line_strip.endswith(('.', '?', '!')) or len(line_strip.split('. ')) < chunk_sentences:
+            if not line_strip.endswith('-'):
+                full_text[i]['text'] = line_strip + ' ' + full_text[i + 1]['text'].strip()
+            else:
+                full_text[i]['text'] = line_strip.rstrip('-') + full_text[i + 1]['text'].strip()
+            line_strip = full_text[i]['text'].strip('\n')
+            full_text.pop(i + 1)
+            lines_cnt -= 1
+            if i == lines_cnt - 1:
+                break
+        i += 1
+    documents = []
+    for i in range(0, len(full_text)):
+        if i > 0:
+            documents.append((
+                '. '.join(full_text[i - 1]['text'].split(". ")[-overlap_sentences:]) + "\n" + '. '.join(full_text[i]['text'].split(". ")[:overlap_sentences]),
+                full_text[i - 1]['page'],
+            ))
+        documents.append((full_text[i]['text'], full_text[i]['page']))
+    return documents
+
+
+def main():
+    args = parser.parse_args()
+    rows = []
+    for pages in (int(p) for p in args.pages.split(",")):
+        records = synthetic_manual(pages)
+        start = perf_counter()
+        documents = list(iter_documents(records, args.chunk_sentences, args.overlap_sentences))
+        streaming = perf_counter() - start
+        row = {"pages": pages, "lines": len(records), "documents": len(documents), "streaming_s": streaming}
+        if pages <= args.skip_legacy_above:
+            legacy_input = copy.deepcopy(records)
+            start = perf_counter()
+            legacy = legacy_documents(legacy_input, args.chunk_sentences, args.overlap_sentences)
+            row["legacy_s"] = perf_counter() - start
+            row["same_output"] = legacy == documents
+        rows.append(row)
+    print_table(rows, ["pages", "lines", "documents", "streaming_s", "legacy_s", "same_output"])
+
+
+if __name__ == "__main__":
+    main()
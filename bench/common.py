@@ -0,0 +1,94 @@
+from time import perf_counter
+from typing import Callable, List
+import numpy as np
+
+
+def measure(fn: Callable, iterations: int, warmup: int = 3) -> List[float]:
+    """Call fn repeatedly and return the duration of every call in seconds"""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(iterations):
+        start = perf_counter()
+        fn()
+        timings.append(perf_counter() - start)
+    return timings
+
+
+def summarize(timings: List[float]) -> dict:
+    """Throughput and latency percentiles for a list of durations in seconds"""
+    arr = np.asarray(timings, dtype=np.float64)
+    total = arr.sum()
+    return {
+        "iterations": int(arr.size),
+        "per_second": float(arr.size / total) if total > 0 else float("inf"),
+        "mean_ms": float(arr.mean() * 1000),
+        "p50_ms": float(np.percentile(arr, 50) * 1000),
+        "p99_ms": float(np.percentile(arr, 99) * 1000),
+    }
+
+
+def print_table(rows: List[dict], columns: List[str]):
+    """Print list of result dicts as a plain text table"""
+    widths = [
+        max(len(c), *(len(_format(r.get(c))) for r in rows)) for c in columns
+    ]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for r in rows:
+        print("  ".join(_format(r.get(c)).ljust(w) for c, w in zip(columns, widths)))
+
+
+def _format(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+def synthetic_gameviews(count: int, seed: int = 0) -> List[np.ndarray]:
+    """Deterministic gameview-sized RGB frames with dark blobs on a light background"""
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(count):
+        frame = np.full((271, 448, 3), 200, dtype=np.uint8)
+        frame += rng.integers(0, 30, frame.shape, dtype=np.uint8)
+        for _ in range(rng.integers(2, 8)):
+            x, y = int(rng.integers(0, 400)), int(rng.integers(0, 230))
+            w, h = int(rng.integers(20, 120)), int(rng.integers(20, 120))
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (20, 20, 20), -1)
+        frames.append(frame)
+    return frames
+
+
+def synthetic_manual(pages: int, lines_per_page: int = 40, seed: int = 0) -> List[dict]:
+    """
+    Deterministic OCR-like records {'page', 'text'} with wrapped, hyphenated sentences,
+    roughly lines_per_page lines per page
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = [
+        "dungeon", "champion", "spell", "potion", "torch", "door", "key", "lord",
+        "chaos", "mana", "stamina", "party", "wizard", "priest", "ninja", "fighter",
+        "rune", "scroll", "weapon", "armour", "food", "water", "level", "stairs",
+    ]
+    records = []
+    for page in range(pages):
+        words = []
+        for _ in range(lines_per_page):
+            sentence = rng.choice(vocabulary, size=int(rng.integers(4, 12)))
+            words.extend(sentence[:-1])
+            words.append(sentence[-1] + str(rng.choice([".", ".", ".", "?", "!"])))
+        line = ""
+        for word in words:
+            if len(line) + len(word) > 60:
+                if rng.random() < 0.1 and len(word) > 5:
+                    records.append({"page": page, "text": line + word[:3] + "-"})
+                    line = word[3:] + " "
+                else:
+                    records.append({"page": page, "text": line.rstrip()})
+                    line = word + " "
+            else:
+                line += word + " "
+        records.append({"page": page, "text": line.rstrip()})
+    return records
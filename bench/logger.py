@@ -0,0 +1,46 @@
+"""
+Hot-path cost of logging an LLM call: synchronous append vs the queued LLMLogger.
+
+python -m bench.logger --calls 2000
+"""
+import argparse
+import tempfile
+from llm_logger import LLMLogger
+from bench.common import measure, summarize, print_table
+
+parser = argparse.ArgumentParser(description="Benchmark LLMLogger")
+parser.add_argument("--calls", type=int, default=2000, help="Logged calls per mode")
+
+PROMPT = [
+    {"role": "system", "content": "You have access to the following functions: ..." * 40},
+    {"role": "user", "content": "User's input: move forward"},
+]
+RESPONSE = {
+    "model": "qwen2:latest",
+    "message": {"role": "assistant", "content": '{"tools": [{"tool": "move", "tool_input": {"direction": "forward"}}]}'},
+    "done": True,
+    "total_duration": 863284500,
+}
+
+
+def legacy_log_action_request(log_dir, prompt, response):
+    """log_action_request as it was before the background queue"""
+    with open(f"{log_dir}/actions.txt", "a") as file:
+        file.write(f"Prompt: {prompt}\n-----------\nResponse: {response}")
+
+
+def main():
+    args = parser.parse_args()
+    rows = []
+    with tempfile.TemporaryDirectory() as log_dir:
+        timings = measure(lambda: legacy_log_action_request(log_dir, PROMPT, RESPONSE), args.calls)
+        rows.append({"mode": "synchronous append", **summarize(timings)})
+        logger = LLMLogger(log_dir=log_dir)
+        timings = measure(lambda: logger.log_action_request(PROMPT, RESPONSE, duration=0.8), args.calls)
+        rows.append({"mode": "queued", **summarize(timings)})
+        logger.close()
+    print_table(rows, ["mode", "per_second", "mean_ms", "p50_ms", "p99_ms"])
+
+
+if __name__ == "__main__":
+    main()
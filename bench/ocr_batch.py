@@ -0,0 +1,208 @@
+"""
+Phi3V.recognize_batch vs one recognize call per page, on CPU.
+Phi-3-vision is replaced by a tiny randomly initialized Llama with a stand-in processor
+that maps every image to a number of image tokens set by its crop grid and a pixel
+embedding, so the batching code of Phi3V runs unchanged. Batched results must equal
+per-image ones. Whole pages come in two sizes; triage crops (--triage) all differ in size
+and batch by crop grid.
+
+python -m bench.ocr_batch --pages 32 --batch 8 --tokens 32
+python -m bench.ocr_batch --pages 32 --batch 8 --tokens 32 --triage
+"""
+import argparse
+from collections import OrderedDict
+from time import perf_counter
+import numpy as np
+import torch
+from PIL import Image
+from transformers import BatchFeature, LlamaConfig, LlamaForCausalLM
+from ocr.phi3v import Phi3V, crop_grid
+from bench.common import print_table
+
+parser = argparse.ArgumentParser(description="Benchmark batched OCR recognition")
+parser.add_argument("--pages", type=int, default=32, help="Page images to recognize")
+parser.add_argument("--batch", type=int, default=8, help="Images per generate call")
+parser.add_argument("--tokens", type=int, default=32, help="Generated tokens per page")
+parser.add_argument("--prompt", type=int, default=200, help="Prompt length in tokens")
+parser.add_argument("--triage", action="store_true", help="Also recognize text block crops of varying size")
+
+VOCAB = 512
+EOS = 1
+IMAGE_TOKEN = -1
+THUMBNAIL = (16, 16)
+
+
+class TinyTokenizer:
+    eos_token_id = EOS
+    pad_token_id = EOS
+
+    def encode(self, text: str):
+        return [2 + ord(c) % (VOCAB - 2) for c in text]
+
+    def batch_decode(self, ids, skip_special_tokens=True, clean_up_tokenization_spaces=False):
+        return [
+            "".join(chr(ord("a") + int(i) % 26) for i in row if not (skip_special_tokens and int(i) < 2))
+            for row in ids
+        ]
+
+
+class TinyImageProcessor:
+    def __call__(self, images, return_tensors="pt"):
+        pixels = [np.asarray(image.convert("L").resize(THUMBNAIL), dtype=np.float32).ravel() / 255 for image in images]
+        return BatchFeature({
+            "pixel_values": torch.from_numpy(np.stack(pixels)),
+            "image_sizes": torch.tensor([[image.height, image.width] for image in images]),
+        })
+
+
+class TinyProcessor:
+    """Like the Phi-3-vision processor: image tokens first, their count depends on the crop grid"""
+
+    def __init__(self):
+        self.tokenizer = TinyTokenizer()
+        self.image_processor = TinyImageProcessor()
+
+    def __call__(self, prompt, images, return_tensors="pt"):
+        pixels = self.image_processor(images)
+        columns, rows = crop_grid(images[0].size)
+        image_tokens = [IMAGE_TOKEN] * (4 + columns * rows + rows)
+        input_ids = torch.tensor([image_tokens + self.tokenizer.encode(prompt)])
+        return BatchFeature({"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids), **pixels})
+
+    def batch_decode(self, ids, **kwargs):
+        return self.tokenizer.batch_decode(ids, **kwargs)
+
+
+class TinyVisionLM(torch.nn.Module):
+    """Causal LM whose image token embeddings come from the pixels, returns prompt + answer ids"""
+
+    def __init__(self):
+        super().__init__()
+        config = LlamaConfig(
+            vocab_size=VOCAB, hidden_size=128, intermediate_size=256, num_hidden_layers=2,
+            num_attention_heads=4, num_key_value_heads=4,
+        )
+        torch.manual_seed(0)
+        self.lm = LlamaForCausalLM(config).eval()
+        self.vision = torch.nn.Linear(THUMBNAIL[0] * THUMBNAIL[1], config.hidden_size)
+
+    @torch.no_grad()
+    def generate(self, input_ids, attention_mask, pixel_values, image_sizes, eos_token_id, max_new_tokens, **kwargs):
+        embeds = self.lm.get_input_embeddings()(input_ids.clamp(min=0))
+        image = self.vision(pixel_values).unsqueeze(1).expand_as(embeds)
+        embeds = torch.where((input_ids == IMAGE_TOKEN).unsqueeze(-1), image, embeds)
+        # a fixed length answer keeps the timing comparable between runs
+        answer = self.lm.generate(
+            inputs_embeds=embeds,
+            attention_mask=attention_mask,
+            max_new_tokens=max_new_tokens,
+            min_new_tokens=max_new_tokens,
+            do_sample=False,
+            eos_token_id=eos_token_id,
+            pad_token_id=eos_token_id,
+        )
+        return torch.cat([input_ids, answer], dim=1)
+
+
+class TinyPhi3V(Phi3V):
+    """Phi3V with the stand-in model, everything but __init__ is the real code"""
+
+    def __init__(self, prompt_tokens: int, max_new_tokens: int):
+        self.device = "cpu"
+        self.processor = TinyProcessor()
+        self.model = TinyVisionLM()
+        self.prompt = "You are an expert OCR system. " * (prompt_tokens // 30 + 1)
+        self.prompt = self.prompt[:prompt_tokens]
+        self.prompt_inputs = OrderedDict()
+        self.generation_args = {"max_new_tokens": max_new_tokens, "temperature": 0.0, "do_sample": False}
+
+
+def legacy_recognize(ocr: Phi3V, image: Image) -> str:
+    """Phi3V.recognize as it was: the prompt is processed again for every image"""
+    inputs = ocr.processor(ocr.prompt, [image], return_tensors="pt").to(ocr.device)
+    generate_ids = ocr.model.generate(
+        **inputs,
+        eos_token_id=ocr.processor.tokenizer.eos_token_id,
+        **ocr.generation_args,
+    )
+    generate_ids = generate_ids[:, inputs["input_ids"].shape[1]:]
+    return ocr.processor.batch_decode(generate_ids, skip_special_tokens=True, clean_up_tokenization_spaces=False)[0]
+
+
+def synthetic_pages(count: int, seed: int = 0):
+    """Gray page images in two sizes, like a manual with a few fold-out pages"""
+    rng = np.random.default_rng(seed)
+    pages = []
+    for i in range(count):
+        height, width = (842, 595) if i % 4 else (595, 842)
+        pages.append(Image.fromarray(rng.integers(0, 256, (height, width), dtype=np.uint8)))
+    return pages
+
+
+def synthetic_crops(count: int, seed: int = 0):
+    """
+    Gray text block crops of different sizes, like ocr.triage cuts from the 595x842
+    pages the OCR pipeline rasterizes: most of the page width, any height
+    """
+    rng = np.random.default_rng(seed)
+    crops = []
+    for _ in range(count):
+        height, width = rng.integers(120, 800), rng.integers(380, 560)
+        crops.append(Image.fromarray(rng.integers(0, 256, (height, width), dtype=np.uint8)))
+    return crops
+
+
+def compare(ocr: Phi3V, name: str, images: list, batch_size: int) -> list:
+    """Per-image and batched rows of one input set, batched results must match"""
+    calls = []
+    generate = ocr._generate
+
+    def counted(inputs):
+        calls.append(len(inputs["input_ids"]))
+        return generate(inputs)
+
+    ocr._generate = counted
+
+    start = perf_counter()
+    single = [legacy_recognize(ocr, image) for image in images]
+    single_s = perf_counter() - start
+
+    start = perf_counter()
+    batched = ocr.recognize_batch(images, batch_size=batch_size)
+    batched_s = perf_counter() - start
+    del ocr._generate
+
+    mismatches = sum(a != b for a, b in zip(single, batched))
+    common = {
+        "images": name,
+        "pages": len(images),
+        "sizes": len({image.size for image in images}),
+        "grids": len({crop_grid(image.size) for image in images}),
+    }
+    return [
+        dict(common, mode="per image", seconds=single_s, pages_per_s=len(images) / single_s, mismatches=None),
+        dict(
+            common,
+            mode=f"batch {batch_size}",
+            generate_calls=len(calls),
+            mean_batch=sum(calls) / max(len(calls), 1),
+            seconds=batched_s,
+            pages_per_s=len(images) / batched_s,
+            mismatches=mismatches,
+        ),
+    ]
+
+
+def main():
+    args = parser.parse_args()
+    ocr = TinyPhi3V(args.prompt, args.tokens)
+    rows = compare(ocr, "pages", synthetic_pages(args.pages), args.batch)
+    if args.triage:
+        rows += compare(ocr, "triage crops", synthetic_crops(args.pages), args.batch)
+    print_table(rows, ["images", "mode", "pages", "sizes", "grids", "generate_calls", "mean_batch", "seconds", "pages_per_s", "mismatches"])
+    for single, batched in zip(rows[::2], rows[1::2]):
+        print(f"{single['images']}: speedup {single['seconds'] / batched['seconds']:.2f}x, mismatching pages: {batched['mismatches']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Serial vs pipelined PDF OCR on CPU. The PDF is generated and the vision model is
+replaced by a stub that sleeps --ocr seconds and returns text derived from the page
+pixels, so both modes must produce the same full_text. Rasterizing overlaps with
+recognition only when there is a free CPU core for the pool. Both are run again over
+the filled OCR store, which must not create the recognizer.
+
+python -m bench.ocr_pipeline --pages 60 --ocr 0.02 --workers 2
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+from time import sleep
+import fitz
+from PIL import Image
+from ocr.pipeline import NO_TEXT, OcrPipeline, ocr_serial
+from ocr.store import OcrStore
+from bench.common import print_table
+
+parser = argparse.ArgumentParser(description="Benchmark pipelined OCR of a PDF")
+parser.add_argument("--pages", type=int, default=60, help="Pages of the generated PDF")
+parser.add_argument("--ocr", type=float, default=0.02, help="Simulated recognition time per page")
+parser.add_argument("--workers", type=int, default=2, help="Rasterizing processes")
+parser.add_argument("--triage", action="store_true", help="Skip blank pages and crop to the text block")
+parser.add_argument("--text-layer", action="store_true", help="Take the text of pages with a text layer from the PDF")
+parser.add_argument("--zoom", type=float, default=2.0, help="Page size multiplier, bigger pages rasterize slower")
+
+MODEL_ID = "stub@prompt-1"
+
+
+class StubRecognizer:
+    """
+    Stands in for Phi3V: waits like a model running on the GPU and returns deterministic
+    text from a thumbnail of the image, blank pages have no text
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def recognize(self, image: Image) -> str:
+        sleep(self.delay)
+        thumbnail = image.reduce(8)
+        if thumbnail.getextrema()[0] == 255:
+            return NO_TEXT
+        digest = hashlib.blake2b(thumbnail.tobytes(), digest_size=8).hexdigest()
+        return f"Page {image.size} {digest}.\nSecond line of {digest}.\n"
+
+
+def make_pdf(path: str, pages: int, zoom: float, scan_every: int = 3):
+    """Text pages, every 10th page blank and every scan_every-th page an image of text"""
+    document = fitz.open()
+    for i in range(pages):
+        page = document.new_page(width=595 * zoom, height=842 * zoom)
+        if i % 10 == 9:
+            continue  # blank page
+        for line in range(40):
+            page.insert_text((40 * zoom, (60 + line * 18) * zoom), f"Page {i} line {line}: the champions enter the dungeon.", fontsize=11 * zoom)
+        if scan_every > 0 and i % scan_every == scan_every - 1:
+            scan = page.get_pixmap(colorspace=fitz.csGRAY)
+            document.delete_page(i)
+            page = document.new_page(width=595 * zoom, height=842 * zoom)
+            page.insert_image(page.rect, pixmap=scan)
+    document.save(path)
+
+
+def page_texts(full_text):
+    """full_text without provenance, a stored page is the same as a recognized one"""
+    return [(record["page"], record["text"]) for record in full_text]
+
+
+def no_model():
+    raise AssertionError("a fully stored book must not load the model")
+
+
+def main():
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf = os.path.join(tmp, "manual.pdf")
+        make_pdf(pdf, args.pages, args.zoom)
+        serial_store = OcrStore(os.path.join(tmp, "serial.db"))
+        pipelined_store = OcrStore(os.path.join(tmp, "pipelined.db"))
+
+        options = {"use_triage": args.triage, "use_text_layer": args.text_layer}
+        serial_text, serial = ocr_serial(pdf, serial_store, MODEL_ID, lambda: StubRecognizer(args.ocr), **options)
+        pipeline = OcrPipeline(
+            pdf, pipelined_store, MODEL_ID, lambda: StubRecognizer(args.ocr), workers=args.workers, **options
+        )
+        pipelined_text = pipeline.run()
+        pipelined = pipeline.stats
+        assert serial_text == pipelined_text, "pipelined OCR produced a different full_text"
+        # identical pages, like the blank ones, share one stored result
+        assert len(serial_store) == len(pipelined_store)
+
+        rerun = OcrPipeline(pdf, pipelined_store, MODEL_ID, no_model, workers=args.workers, **options)
+        assert page_texts(rerun.run()) == page_texts(serial_text)
+        rerun_serial_text, rerun_serial = ocr_serial(pdf, serial_store, MODEL_ID, no_model, **options)
+        assert page_texts(rerun_serial_text) == page_texts(serial_text)
+        serial_store.close()
+        pipelined_store.close()
+
+    rows = [
+        dict(serial, mode="serial"),
+        dict(pipelined, mode=f"pipelined x{args.workers}"),
+        dict(rerun_serial, mode="serial, stored"),
+        dict(rerun.stats, mode=f"pipelined x{args.workers}, stored"),
+    ]
+    print_table(rows, ["mode", "pages", "text_layer", "cached", "skipped", "model_input_saved", "wall_s", "pages_per_s", "hash_pages_per_s", "raster_pages_per_s", "ocr_pages_per_s", "write_pages_per_s"])
+    print(f"speedup: {serial['wall_s'] / pipelined['wall_s']:.2f}x, full_text identical ({len(serial_text)} lines)")
+
+
+if __name__ == "__main__":
+    main()
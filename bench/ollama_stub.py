@@ -0,0 +1,125 @@
+"""
+Local stand-in for the ollama HTTP API (/api/chat, /api/tags) answering every chat
+with the same tool call, so LLM client overhead can be measured without a model.
+
+python -m bench.ollama_stub --port 11434 --latency 0.2
+"""
+import argparse
+import json
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import sleep
+
+STUB_TOOLS = {"tools": [{"tool": "move", "tool_input": {"direction": "forward"}}]}
+# pieces of the answer sent one by one when streaming
+STREAM_CHUNK = 16
+
+parser = argparse.ArgumentParser(description="Serve a stub ollama API")
+parser.add_argument("--host", type=str, default="127.0.0.1")
+parser.add_argument("--port", type=int, default=11434)
+parser.add_argument("--latency", type=float, default=0.0, help="Seconds before every answer")
+
+
+class StubOllamaServer:
+    """ThreadingHTTPServer on a background thread; port 0 picks a free port"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, answer: dict = None):
+        self.latency = latency
+        self.answer = json.dumps(answer if answer is not None else STUB_TOOLS)
+        self.requests = 0
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubOllamaServer":
+        self._thread = Thread(target=self.httpd.serve_forever, name="ollama-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _message(self, model: str, content: str, done: bool) -> dict:
+        message = {
+            "model": model,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "message": {"role": "assistant", "content": content},
+            "done": done,
+        }
+        if done:
+            message.update({"done_reason": "stop", "total_duration": int(self.latency * 1e9), "eval_count": len(self.answer)})
+        return message
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are written separately, do not wait for delayed ACKs
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send(200, json.dumps({"models": []}).encode())
+                else:
+                    self._send(404, b'{"error": "not found"}')
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path != "/api/chat":
+                    self._send(404, b'{"error": "not found"}')
+                    return
+                server.requests += 1
+                sleep(server.latency)
+                model = request.get("model", "")
+                if not request.get("stream", True):
+                    self._send(200, json.dumps(server._message(model, server.answer, True)).encode())
+                    return
+                pieces = [server.answer[i:i + STREAM_CHUNK] for i in range(0, len(server.answer), STREAM_CHUNK)]
+                lines = [json.dumps(server._message(model, piece, False)) for piece in pieces]
+                lines.append(json.dumps(server._message(model, "", True)))
+                self._send(200, "".join(line + "\n" for line in lines).encode(), "application/x-ndjson")
+
+        return Handler
+
+
+def main():
+    args = parser.parse_args()
+    server = StubOllamaServer(args.host, args.port, args.latency)
+    print(f"Stub ollama at {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
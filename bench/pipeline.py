@@ -0,0 +1,75 @@
+"""
+Throughput of serial vs pipelined step execution.
+The game is simulated: a click takes --click seconds and the view needs --wait seconds
+to settle before it is captured; segmentation is the real VisionModel pipeline plus
+--process seconds. Only processing overlaps with the next input, so that is the gain.
+
+python -m bench.pipeline --steps 100 --wait 0.05 --click 0.005
+"""
+import argparse
+from itertools import cycle
+from time import perf_counter, sleep
+from PIL import Image
+from player import GAMEVIEW_BOX
+from player.pipeline import StepPipeline
+from player.vision import VisionModel
+from bench.common import print_table, synthetic_gameviews
+
+parser = argparse.ArgumentParser(description="Benchmark pipelined step execution")
+parser.add_argument("--steps", type=int, default=100, help="Steps per mode")
+parser.add_argument("--wait", type=float, default=0.05, help="Simulated view change time")
+parser.add_argument("--click", type=float, default=0.005, help="Simulated click time")
+parser.add_argument("--process", type=float, default=0.0, help="Extra per-step processing time")
+
+
+def main():
+    args = parser.parse_args()
+    screens = []
+    for view in synthetic_gameviews(16):
+        screen = Image.new("RGB", (640, 350))
+        screen.paste(Image.fromarray(view), GAMEVIEW_BOX[:2])
+        screens.append(screen)
+    frames = cycle(screens)
+    vision = VisionModel(video_game_name="Dungeon Master", logger=None)
+
+    def click():
+        sleep(args.click)
+
+    def capture():
+        sleep(args.wait)
+        return next(frames)
+
+    def process(screen):
+        if args.process > 0:
+            sleep(args.process)
+        return vision.segment_gameview(screen.crop(GAMEVIEW_BOX))
+
+    start = perf_counter()
+    for _ in range(args.steps):
+        click()
+        process(capture())
+    serial = perf_counter() - start
+
+    applied = []
+    pipeline = StepPipeline(capture, process, lambda job: applied.append(job.step))
+    start = perf_counter()
+    for step in range(args.steps):
+        pipeline.wait_captured()
+        click()
+        pipeline.submit(step)
+    pipeline.sync()
+    pipelined = perf_counter() - start
+    pipeline.close()
+    assert applied == list(range(args.steps)), "steps applied out of order"
+
+    print_table(
+        [
+            {"mode": "serial", "steps_per_second": args.steps / serial},
+            {"mode": "pipelined", "steps_per_second": args.steps / pipelined},
+        ],
+        ["mode", "steps_per_second"],
+    )
+
+
+if __name__ == "__main__":
+    main()
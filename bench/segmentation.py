@@ -0,0 +1,63 @@
+"""
+Compare the array-backed segmentation result against the old pydantic + overlay path.
+
+python -m bench.segmentation --frames 50 --iterations 200
+"""
+import argparse
+from itertools import cycle
+from PIL import Image
+import cv2
+import numpy as np
+from player.vision import VisionModel, VisionRectangle
+from bench.common import measure, summarize, print_table, synthetic_gameviews
+
+parser = argparse.ArgumentParser(description="Benchmark VisionModel.segment_gameview")
+parser.add_argument("--frames", type=int, default=50, help="Distinct synthetic gameviews")
+parser.add_argument("--iterations", type=int, default=200, help="Segmentations per mode")
+
+
+def legacy_segment_gameview(image: Image):
+    """segment_gameview as it was before SegmentationResult"""
+    cv2_image = np.array(image)
+    gray = cv2.cvtColor(cv2_image, cv2.COLOR_BGR2GRAY)
+    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    kernel = np.ones((4, 4), np.uint8)
+    opening = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel, iterations=3)
+    sure_bg = cv2.dilate(opening, kernel, iterations=3)
+    contours, hierarchy = cv2.findContours(sure_bg, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    rectangles = []
+    for idx, c in enumerate(contours):
+        if hierarchy[0][idx][3] != -1:
+            continue
+        boundRect = cv2.boundingRect(c)
+        if boundRect[2] * boundRect[3] < 500:
+            continue
+        rect = VisionRectangle(
+            x=boundRect[0], y=boundRect[1], width=boundRect[2], height=boundRect[3], color=(255, 0, 0)
+        )
+        rectangles.append(rect)
+        cv2.rectangle(
+            cv2_image, (rect.x, rect.y), (rect.x + rect.width, rect.y + rect.height), rect.color, 2
+        )
+    return (Image.fromarray(cv2_image), rectangles)
+
+
+def main():
+    args = parser.parse_args()
+    images = [Image.fromarray(f) for f in synthetic_gameviews(args.frames)]
+    vision = VisionModel(video_game_name="Dungeon Master", logger=None)
+
+    def run(fn):
+        frames = cycle(images)
+        return summarize(measure(lambda: fn(next(frames)), args.iterations))
+
+    rows = [
+        {"mode": "legacy (pydantic + overlay)", **run(legacy_segment_gameview)},
+        {"mode": "array result", **run(vision.segment_gameview)},
+        {"mode": "array result + overlay", **run(lambda i: vision.segment_gameview(i).overlay)},
+    ]
+    print_table(rows, ["mode", "per_second", "mean_ms", "p50_ms", "p99_ms"])
+
+
+if __name__ == "__main__":
+    main()
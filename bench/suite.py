@@ -0,0 +1,258 @@
+"""
+Benchmark suite over the player, vision and knowledge-base hot paths on fixed inputs.
+Results go to a JSON file; --compare flags regressions against a saved baseline and
+exits with status 1 when there are any.
+
+python -m bench.suite --output bench_results.json
+python -m bench.suite --output new.json --compare bench_results.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+from datetime import datetime, timezone
+from itertools import count, cycle
+from typing import Dict, List
+import cv2
+import numpy as np
+from PIL import Image
+from bench.common import measure, summarize, print_table, synthetic_gameviews, synthetic_manual
+from bench.ollama_stub import StubOllamaServer
+
+BENCHMARKS = ("segment", "buttons", "lookaround", "chunking", "llm")
+METRIC = "p50_ms"
+# relative slowdown of the metric reported as a regression
+THRESHOLD = 0.2
+# smaller absolute changes are timer noise, not regressions
+MIN_DELTA_MS = 0.05
+SIM_SEED = 0
+SUITE_VERSION = 1
+
+parser = argparse.ArgumentParser(description="Run the benchmark suite")
+parser.add_argument("--output", type=str, default="bench_results.json", help="JSON file for the results")
+parser.add_argument("--compare", type=str, default=None, help="Baseline JSON to compare the results with")
+parser.add_argument("--threshold", type=float, default=THRESHOLD, help="Relative slowdown flagged as a regression")
+parser.add_argument("--min-delta-ms", type=float, default=MIN_DELTA_MS, help="Ignore smaller absolute changes")
+parser.add_argument("--metric", type=str, default=METRIC, choices=("mean_ms", "p50_ms", "p99_ms"))
+parser.add_argument("--only", type=str, default=",".join(BENCHMARKS), help="Comma separated benchmarks to run")
+parser.add_argument("--iterations", type=int, default=50, help="Measured calls per benchmark")
+parser.add_argument("--frames", type=int, default=32, help="Gameviews per segmentation input set")
+parser.add_argument("--frames-dir", type=str, default=None, help="Recorded screenshots or gameview crops")
+parser.add_argument("--manual-pages", type=str, default="10,100,1000", help="Comma separated manual sizes")
+parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds the stub ollama waits per answer")
+
+
+def _sim_player():
+    """Player on the headless simulated dungeon with an in-memory segmentation cache, close it after use"""
+    from player import Player
+    from player.segment_cache import SegmentationCache
+    from player.simulator import SimulatedEnvironment
+
+    return Player(
+        "bench",
+        environment=SimulatedEnvironment(seed=SIM_SEED),
+        calibration_file=None,
+        segment_cache=SegmentationCache(),
+    )
+
+
+def _recorded_gameviews(path: str, limit: int) -> List[Image.Image]:
+    """Gameview crops from a directory of recorded frames, full screenshots are cropped"""
+    from player import GAMEVIEW_BOX, GAMEVIEW_SIZE
+    from player.capture import FileFrameSource
+
+    source = FileFrameSource(path, loop=False)
+    views = []
+    for _ in range(min(len(source.files), limit)):
+        frame = source.grab(None)
+        views.append(frame if frame.size == GAMEVIEW_SIZE else frame.crop(GAMEVIEW_BOX))
+    return views
+
+
+def _sim_gameviews(limit: int) -> List[Image.Image]:
+    """Views of the simulated dungeon from its open cells in all directions"""
+    from player.simulator import SimulatedDungeon, generate_dungeon
+    from player.types import GlobalDirection
+
+    dungeon = SimulatedDungeon(generate_dungeon(seed=SIM_SEED))
+    views = []
+    for y, x in zip(*np.nonzero(~dungeon.walls)):
+        for facing in GlobalDirection:
+            dungeon.position, dungeon.facing = (int(x), int(y)), facing
+            views.append(dungeon.render_view())
+            if len(views) >= limit:
+                return views
+    return views
+
+
+def bench_segment(args) -> Dict[str, dict]:
+    from player.vision import VisionModel
+
+    vision = VisionModel(video_game_name="Dungeon Master", logger=None)
+    inputs = {
+        "sim": _sim_gameviews(args.frames),
+        "synthetic": [Image.fromarray(f) for f in synthetic_gameviews(args.frames)],
+    }
+    if args.frames_dir is not None:
+        inputs["recorded"] = _recorded_gameviews(args.frames_dir, args.frames)
+    results = {}
+    for name, views in inputs.items():
+        frames = cycle(views)
+        timings = measure(lambda: vision.segment_gameview(next(frames)), args.iterations)
+        results[f"vision.segment_gameview[{name}]"] = summarize(timings)
+    return results
+
+
+def bench_buttons(args) -> Dict[str, dict]:
+    from player.locator import UI_ELEMENTS_DIR
+
+    with _sim_player() as player:
+        buttons = []
+        for name in sorted(player.locator.templates):
+            with Image.open(os.path.join(UI_ELEMENTS_DIR, f"{name}.png")) as image:
+                buttons.append(image.convert("RGBA"))
+        images = cycle(buttons)
+        screen = player.make_screenshot()
+        return {
+            "player._get_ui_button_coordinates": summarize(
+                measure(lambda: player._get_ui_button_coordinates(next(images)), args.iterations)
+            ),
+            "locator.locate_all": summarize(measure(lambda: player.locator.locate_all(screen), args.iterations)),
+        }
+
+
+def bench_lookaround(args) -> Dict[str, dict]:
+    from player import GAMEVIEW_SIZE
+    from player.mosaic import LookaroundMosaic
+
+    views = {name: np.asarray(view) for name, view in zip(("forward", "right", "back", "left"), _sim_gameviews(4))}
+    mosaic = LookaroundMosaic(GAMEVIEW_SIZE)
+    with _sim_player() as player:
+        return {
+            "mosaic.compose": summarize(measure(lambda: mosaic.compose(views), args.iterations)),
+            "player.lookaround[fast]": summarize(measure(lambda: player.lookaround(fast=True), args.iterations)),
+            "player.lookaround": summarize(measure(player.lookaround, args.iterations)),
+        }
+
+
+def bench_chunking(args) -> Dict[str, dict]:
+    from kb.chunker import iter_chunks
+
+    results = {}
+    for pages in (int(p) for p in args.manual_pages.split(",")):
+        records = synthetic_manual(pages)
+        iterations = max(3, min(args.iterations, 1000 // pages))
+        timings = measure(lambda: sum(1 for _ in iter_chunks(records, "bench", 10, 5)), iterations, warmup=1)
+        results[f"chunker.iter_chunks[{pages} pages]"] = {"lines": len(records), **summarize(timings)}
+    return results
+
+
+def bench_llm(args) -> Dict[str, dict]:
+    # ollama reads OLLAMA_HOST on import, main() points it at the stub first
+    from llm_logger import LLMLogger
+    from player.intent import IntentCache
+    from player.smart_controller import SmartController
+
+    phrases = (f"perform the dance of the {i} moons" for i in count())
+    results = {}
+    with tempfile.TemporaryDirectory() as log_dir:
+        logger = LLMLogger(log_dir=log_dir)
+        smc = SmartController(video_game_name="Dungeon Master", model="stub", logger=logger, intent_cache=IntentCache())
+        if len(smc.parse_action_phrase("perform the opening dance")) == 0:
+            raise Exception("No tools from the stub ollama server")
+        results["smart_controller.parse_action_phrase[llm]"] = summarize(
+            measure(lambda: smc.parse_action_phrase(next(phrases)), args.iterations)
+        )
+        results["smart_controller.parse_action_phrase_stream[llm]"] = summarize(
+            measure(lambda: list(smc.parse_action_phrase_stream(next(phrases))), args.iterations)
+        )
+        results["smart_controller.parse_action_phrase[cached]"] = summarize(
+            measure(lambda: smc.parse_action_phrase("perform the opening dance"), args.iterations)
+        )
+        logger.close()
+    return results
+
+
+def metadata(args) -> dict:
+    return {
+        "suite_version": SUITE_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "iterations": args.iterations,
+    }
+
+
+def compare(
+    results: Dict[str, dict], baseline: Dict[str, dict], metric: str, threshold: float, min_delta_ms: float = MIN_DELTA_MS
+) -> List[dict]:
+    """Change of the metric of every benchmark against the baseline"""
+    rows = []
+    for name in sorted(set(results) | set(baseline)):
+        current = results.get(name, {}).get(metric)
+        previous = baseline.get(name, {}).get(metric)
+        row = {"benchmark": name, "baseline": previous, "current": current, "change": None}
+        if previous is None:
+            row["status"] = "new"
+        elif current is None:
+            row["status"] = "missing"
+        else:
+            change = current / previous - 1 if previous > 0 else 0.0
+            row["change"] = f"{change:+.1%}"
+            if abs(current - previous) < min_delta_ms:
+                row["status"] = "ok"
+            elif change > threshold:
+                row["status"] = "REGRESSION"
+            elif change < -threshold:
+                row["status"] = "faster"
+            else:
+                row["status"] = "ok"
+        rows.append(row)
+    return rows
+
+
+def main():
+    args = parser.parse_args()
+    selected = [b for b in args.only.split(",") if b]
+    unknown = set(selected) - set(BENCHMARKS)
+    if len(unknown) > 0:
+        parser.error(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+    stub = None
+    if "llm" in selected:
+        stub = StubOllamaServer(latency=args.llm_latency).start()
+        os.environ["OLLAMA_HOST"] = stub.url
+    results = {}
+    try:
+        for name in BENCHMARKS:
+            if name in selected:
+                print(f"Running {name}...")
+                results.update(globals()[f"bench_{name}"](args))
+    finally:
+        if stub is not None:
+            stub.close()
+
+    with open(args.output, "w") as file:
+        json.dump({"meta": metadata(args), "results": results}, file, indent=2)
+    print_table([{"benchmark": name, **r} for name, r in results.items()], ["benchmark", "per_second", "mean_ms", "p50_ms", "p99_ms"])
+    print(f"Results written to {args.output}")
+
+    if args.compare is None:
+        return
+    with open(args.compare) as file:
+        baseline = json.load(file)["results"]
+    rows = compare(results, baseline, args.metric, args.threshold, args.min_delta_ms)
+    print(f"\nCompared {args.metric} with {args.compare} (threshold {args.threshold:.0%})")
+    print_table(rows, ["benchmark", "baseline", "current", "change", "status"])
+    regressions = [r["benchmark"] for r in rows if r["status"] == "REGRESSION"]
+    if len(regressions) > 0:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import hashlib
+from typing import Iterable, Iterator, Tuple
+
+SENTENCE_ENDS = ('.', '?', '!')
+
+
+class _Chunk:
+    """Text of a chunk kept as a list of parts so appending a line is O(len(line))"""
+
+    def __init__(self, text: str):
+        self.parts = [text] if len(text) > 0 else []
+        self.separators = text.count('. ')
+
+    def endswith(self, suffix) -> bool:
+        return len(self.parts) > 0 and self.parts[-1].endswith(suffix)
+
+    def sentences(self) -> int:
+        return self.separators + 1
+
+    def rstrip(self, chars: str):
+        while len(self.parts) > 0:
+            part = self.parts[-1].rstrip(chars)
+            if len(part) > 0:
+                self.parts[-1] = part
+                return
+            self.parts.pop()
+
+    def append(self, piece: str):
+        if len(piece) == 0:
+            return
+        self.separators += piece.count('. ')
+        if piece.startswith(' ') and self.endswith('.'):
+            self.separators += 1
+        self.parts.append(piece)
+
+    def text(self) -> str:
+        return ''.join(self.parts)
+
+
+def chunk_lines(records: Iterable[dict], chunk_sentences: int = 10) -> Iterator[dict]:
+    """
+    Merge {'page': <int>, 'text': <line>} records into chunks of at least chunk_sentences
+    sentences ending with a full sentence, in a single pass. Lines ending with '-' are
+    joined without a space. A chunk takes the page of its first line.
+    The input is not modified.
+    """
+    lines = iter(records)
+    current = next(lines, None)
+    while current is not None:
+        following = next(lines, None)
+        if following is None:
+            # the last line is kept as it is
+            yield {'page': current['page'], 'text': current['text']}
+            return
+        chunk = _Chunk(current['text'].strip('\n '))
+        merged = False
+        while not chunk.endswith(SENTENCE_ENDS) or chunk.sentences() < chunk_sentences:
+            if not chunk.endswith('-'):
+                chunk.append(' ' + following['text'].strip())
+            else:
+                chunk.rstrip('-')
+                chunk.append(following['text'].strip())
+            merged = True
+            following = next(lines, None)
+            if following is None:
+                break
+        yield {
+            'page': current['page'],
+            'text': chunk.text() if merged else current['text'],
+        }
+        current = following
+
+
+def _tail(text: str, sentences: int) -> str:
+    return '. '.join(text.split('. ')[-sentences:])
+
+
+def _head(text: str, sentences: int) -> str:
+    return '. '.join(text.split('. ')[:sentences])
+
+
+def iter_documents(
+    records: Iterable[dict],
+    chunk_sentences: int = 10,
+    overlap_sentences: int = 5,
+) -> Iterator[Tuple[str, int]]:
+    """
+    Yield (document, page) to embed: every chunk, preceded by an overlap window made of
+    the last overlap_sentences of the previous chunk and the first ones of this chunk.
+    """
+    previous = None
+    for chunk in chunk_lines(records, chunk_sentences):
+        if previous is not None:
+            yield (
+                _tail(previous['text'], overlap_sentences) + "\n" + _head(chunk['text'], overlap_sentences),
+                previous['page'],
+            )
+        yield chunk['text'], chunk['page']
+        previous = chunk
+
+
+def chunk_id(document: str, page: int, book_name: str, chunk_sentences: int, overlap_sentences: int, occurrence: int = 1) -> str:
+    """Stable id of a chunk, changes when its text, place in the book or chunking changes"""
+    key = f'{book_name}\0{page}\0{chunk_sentences}\0{overlap_sentences}\0{occurrence}\0{document}'
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def iter_chunks(full_text, book_name: str, chunk_sentences: int, overlap_sentences: int):
+    """Chunks of the book as (chunk id, document, page), ids unique within the book"""
+    seen = set()
+    # Combine text into chunks of {chunk_sentences} sentences with overlaps between them
+    for document, page in iter_documents(full_text, chunk_sentences, overlap_sentences):
+        doc_id = chunk_id(document, page, book_name, chunk_sentences, overlap_sentences)
+        occurrence = 1
+        while doc_id in seen:
+            # the same text on the same page again
+            occurrence += 1
+            doc_id = chunk_id(document, page, book_name, chunk_sentences, overlap_sentences, occurrence)
+        seen.add(doc_id)
+        yield doc_id, document, page
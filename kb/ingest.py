@@ -0,0 +1,50 @@
+import queue
+from threading import Thread
+
+
+class BatchWriter:
+    """
+    Write embedded batches to a chromadb collection on a background thread, so the next
+    batch is embedded while the previous one is stored. At most max_pending batches wait
+    in memory.
+    """
+
+    def __init__(self, db_collection, max_pending: int = 1):
+        self.db_collection = db_collection
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._thread = Thread(target=self._worker, name='kb-writer', daemon=True)
+        self._thread.start()
+
+    def put(self, ids, documents, metadatas, embeddings):
+        self._check()
+        self._queue.put((ids, documents, metadatas, embeddings))
+
+    def close(self):
+        """Wait for pending batches and re-raise a write error, if any"""
+        self._queue.put(None)
+        self._thread.join()
+        self._check()
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+    def _worker(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                break
+            if self._error is not None:
+                # drop everything after a failed batch
+                continue
+            ids, documents, metadatas, embeddings = batch
+            try:
+                self.db_collection.add(
+                    ids=ids,
+                    documents=documents,
+                    metadatas=metadatas,
+                    embeddings=embeddings,
+                )
+            except Exception as e:
+                self._error = e
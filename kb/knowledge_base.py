@@ -1,6 +1,16 @@
-import uuid
 import chromadb
 from chromadb.utils import embedding_functions
+from tqdm import tqdm
+from kb.chunker import iter_chunks
+from kb.ingest import BatchWriter
+from kb.query_cache import LRU, QUERY_CACHE_SIZE
+from typing import List
+
+EMBEDDING_MODEL = "mixedbread-ai/mxbai-embed-large-v1"
+EMBED_BATCH_SIZE = 256
+# keys of a chromadb query result holding one entry per query text
+QUERY_RESULT_KEYS = ('ids', 'documents', 'metadatas', 'distances', 'embeddings', 'uris', 'data')
+
 
 class KnowledgeBase:
     def __init__(self, path: str, embedding_model: str, device: str):
@@ -23,16 +33,21 @@ class KnowledgeBase:
         self.documents = []
         self.ids = []
         self.metadatas = []
+        self._collections = {}
+        self.query_embeddings = LRU(QUERY_CACHE_SIZE)
+        self.query_results = LRU(QUERY_CACHE_SIZE)
 
     def reset(self):
         """
         Reset current database
         """
         self.client.reset()
+        self._collections.clear()
+        self.query_results.clear()
 
-    def _add_embed_document(self, document: str, page: int, book_name: str):
+    def _add_embed_document(self, document: str, page: int, book_name: str, doc_id: str):
         self.documents.append(document)
-        self.ids.append(str(uuid.uuid4()))
+        self.ids.append(doc_id)
         self.metadatas.append({
             'book': book_name,
             'page': page
@@ -43,66 +58,104 @@ class KnowledgeBase:
         self.ids.clear()
         self.metadatas.clear()
 
-    def embed(self, full_text, collection: str, book_name: str, chunk_sentences=10, overlap_sentences=5):
+    def embed(self, full_text, collection: str, book_name: str, chunk_sentences=10, overlap_sentences=5, batch_size=EMBED_BATCH_SIZE):
         """
-        Embed the text and store in chromadb
+        Embed the text and store in chromadb. Chunk ids are derived from their content,
+        so only new or changed chunks are embedded and chunks which disappeared from
+        the book are deleted. Documents are embedded and written in batches, so memory use
+        does not depend on the book size and an interrupted run just continues.
 
-        full_text - array of objects like {'page': <int>, 'text': 'line from the page'}
+        full_text - iterable of objects like {'page': <int>, 'text': 'line from the page'}, not modified
         collection - string - collection in database where to store the embeddings
         chuck_sentences - int - how many sentences to make in one chunk
         overlap_sentences - int - how many sentences to overlap between chunks
+        batch_size - int - how many documents to embed and store at once
+        returns dict with counts of added, unchanged and removed chunks
         """
-        # Combine text into chunks of {chunk_sentences} sentences. 
-        lines_cnt = len(full_text)
-        i = 0
-        while i < lines_cnt-1:
-            line_strip = full_text[i]['text'].strip('\n ')
-            while not line_strip.endswith(('.', '?', '!')) or len(line_strip.split('. ')) < chunk_sentences:
-                if not line_strip.endswith('-'):
-                    full_text[i]['text'] = line_strip + ' ' + full_text[i+1]['text'].strip()
-                else:
-                    full_text[i]['text'] = line_strip.rstrip('-') + full_text[i+1]['text'].strip()
-                line_strip = full_text[i]['text'].strip('\n')
-                full_text.pop(i+1)
-                lines_cnt -= 1
-                if i == lines_cnt - 1:
-                    break
-            i += 1
-
-        # Create object for embedding and storing
-        for i in range(0, len(full_text)):
-            if i > 0:
+        db_collection = self._collection(collection)
+        # stored results of this collection are about to change
+        self.query_results.drop(lambda key: key[0] == collection)
+        existing = set(db_collection.get(where={'book': book_name}, include=[])['ids'])
+        seen = set()
+        stats = {'added': 0, 'unchanged': 0, 'removed': 0}
+        writer = BatchWriter(db_collection)
+        progress = tqdm(desc=f'Embedding {book_name}', unit='chunk')
+        try:
+            for doc_id, document, page in iter_chunks(full_text, book_name, chunk_sentences, overlap_sentences):
+                seen.add(doc_id)
+                progress.update(1)
+                if doc_id in existing:
+                    stats['unchanged'] += 1
+                    continue
+                stats['added'] += 1
                 self._add_embed_document(
-                    document='. '.join(full_text[i-1]['text'].split(". ")[-overlap_sentences:]) + "\n" + '. '.join(full_text[i]['text'].split(". ")[:overlap_sentences]),
-                    page=full_text[i-1]['page'],
-                    book_name=book_name
+                    document=document,
+                    page=page,
+                    book_name=book_name,
+                    doc_id=doc_id,
                 )
+                if len(self.documents) >= batch_size:
+                    self._write_embed_batch(writer)
+            if len(self.documents) > 0:
+                self._write_embed_batch(writer)
+        finally:
+            progress.close()
+            self._reset_embed_documents()
+            # commit what was already embedded, even after an error
+            writer.close()
+        removed = list(existing - seen)
+        for i in range(0, len(removed), batch_size):
+            db_collection.delete(ids=removed[i:i + batch_size])
+        stats['removed'] = len(removed)
+        print(f"{book_name}: {stats['added']} added, {stats['unchanged']} unchanged, {stats['removed']} removed")
+        return stats
 
-            self._add_embed_document(
-                document=full_text[i]['text'],
-                page=full_text[i]['page'],
-                book_name=book_name
-            )
-
-        print("Do embed and store in database")
-        db_collection = self.client.get_or_create_collection(collection, embedding_function=self.sentence_transformer_ef)
-        db_collection.add(
-            documents=self.documents,
-            ids=self.ids,
-            metadatas=self.metadatas,
-        )
+    def _write_embed_batch(self, writer: BatchWriter):
+        """Embed collected documents and hand them over to the writer"""
+        embeddings = self.sentence_transformer_ef(self.documents)
+        writer.put(list(self.ids), list(self.documents), list(self.metadatas), embeddings)
         self._reset_embed_documents()
 
-
     def peek(self, collection: str):
-        db_collection = self.client.get_or_create_collection(collection, embedding_function=self.sentence_transformer_ef)
-        return db_collection.peek()
+        return self._collection(collection).peek()
 
+    def _collection(self, collection: str):
+        """Collection handle, looked up once per collection"""
+        db_collection = self._collections.get(collection)
+        if db_collection is None:
+            db_collection = self.client.get_or_create_collection(collection, embedding_function=self.sentence_transformer_ef)
+            self._collections[collection] = db_collection
+        return db_collection
 
     def query(self, search: str, collection: str, n_results = 3):
-        db_collection = self.client.get_or_create_collection(collection, embedding_function=self.sentence_transformer_ef)
-        results = db_collection.query(
-            query_texts=[search],
-            n_results=n_results
-        )
-        return results
\ No newline at end of file
+        return self.query_batch([search], collection, n_results)[0]
+
+    def query_batch(self, searches: List[str], collection: str, n_results = 3) -> List[dict]:
+        """
+        Query several topics at once. Results of repeated topics and embeddings of
+        repeated query texts are served from LRU caches.
+        Returns one result per topic, shaped like a single-text chromadb query result.
+        """
+        results = [self.query_results.get((collection, search, n_results)) for search in searches]
+        missing = list(dict.fromkeys(s for s, r in zip(searches, results) if r is None))
+        if len(missing) > 0:
+            embeddings = [self.query_embeddings.get(search) for search in missing]
+            to_embed = [search for search, e in zip(missing, embeddings) if e is None]
+            if len(to_embed) > 0:
+                new_embeddings = dict(zip(to_embed, self.sentence_transformer_ef(to_embed)))
+                for search, embedding in new_embeddings.items():
+                    self.query_embeddings.put(search, embedding)
+                embeddings = [e if e is not None else new_embeddings[s] for s, e in zip(missing, embeddings)]
+            batch = self._collection(collection).query(
+                query_embeddings=embeddings,
+                n_results=n_results
+            )
+            found = {}
+            for i, search in enumerate(missing):
+                found[search] = {
+                    key: [value[i]] if key in QUERY_RESULT_KEYS and value is not None else value
+                    for key, value in batch.items()
+                }
+                self.query_results.put((collection, search, n_results), found[search])
+            results = [r if r is not None else found[s] for s, r in zip(searches, results)]
+        return results
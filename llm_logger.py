@@ -1,23 +1,245 @@
 from PIL import Image
+import atexit
+import glob
+import gzip
+import json
 import os
+import queue
+import shutil
+from collections import OrderedDict
+from threading import Thread
+from time import time, strftime, localtime
 from typing import Tuple, List
 
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_MAX_AGE = 24 * 60 * 60
+LOG_BACKUP_COUNT = 10
+LOG_BATCH_SIZE = 64
+LOG_FLUSH_INTERVAL = 0.5
+
+
+class RotatingJsonl:
+    """JSONL file rotated by size and age, rotated files are gzipped"""
+
+    def __init__(self, path: str, max_bytes: int, max_age: float, backup_count: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backup_count = backup_count
+        self.opened = None
+        self.file = None
+
+    def write(self, lines: List[str]):
+        if self.file is None:
+            self._open()
+        elif self.file.tell() >= self.max_bytes or time() - self.opened >= self.max_age:
+            self.rotate()
+            self._open()
+        self.file.write("".join(lines))
+        self.file.flush()
+
+    def _open(self):
+        self.file = open(self.path, "a")
+        self.opened = time()
+        if self.file.tell() > 0:
+            # continue the existing file, age it by its last modification
+            self.opened = min(self.opened, os.path.getmtime(self.path))
+
+    def rotate(self):
+        """Move the current file aside as <name>.<timestamp>.jsonl.gz"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if not os.path.isfile(self.path) or os.path.getsize(self.path) == 0:
+            return
+        base, ext = os.path.splitext(self.path)
+        now = time()
+        stamp = (
+            f"{strftime('%Y%m%d-%H%M%S', localtime(now))}-{int(now * 1000) % 1000:03d}"
+        )
+        rotated = f"{base}.{stamp}{ext}.gz"
+        with open(self.path, "rb") as src, gzip.open(rotated, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(self.path)
+        backups = sorted(glob.glob(f"{base}.*{ext}.gz"))
+        for old in backups[: max(len(backups) - self.backup_count, 0)]:
+            os.remove(old)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class RotatingImages:
+    """
+    Image dumps of a directory pruned by total size and age, oldest first.
+    Images found there at start count towards the limits.
+    """
+
+    def __init__(self, directory: str, pattern: str, max_bytes: int, max_age: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        # file name -> (modification time, size), oldest first
+        self.files = OrderedDict()
+        self.total = 0
+        found = []
+        for path in glob.glob(os.path.join(self.directory, pattern)):
+            stat = os.stat(path)
+            found.append((stat.st_mtime, os.path.basename(path), stat.st_size))
+        for mtime, name, size in sorted(found):
+            self.files[name] = (mtime, size)
+            self.total += size
+
+    def save(self, image: Image, name: str):
+        path = os.path.join(self.directory, name)
+        image.save(path)
+        if name in self.files:
+            self.total -= self.files.pop(name)[1]
+        size = os.path.getsize(path)
+        self.files[name] = (time(), size)
+        self.total += size
+        self.prune()
+
+    def prune(self):
+        oldest = time() - self.max_age
+        while len(self.files) > 0:
+            name, (mtime, size) = next(iter(self.files.items()))
+            if self.total <= self.max_bytes and mtime >= oldest:
+                break
+            self.files.popitem(last=False)
+            self.total -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
 
 class LLMLogger:
-    """Class for logging AI models requests and responses"""
+    """
+    Class for logging AI models requests and responses.
+    Records are queued and written as JSONL by a background thread in batches,
+    so logging does not block the caller on disk I/O. Vision images are kept as
+    long as the vision log and its backups: up to backup_count times the size and
+    age limits of a log file. Records logged after close() are dropped.
+    """
 
-    def __init__(self, log_dir: str = "./log"):
+    def __init__(
+        self,
+        log_dir: str = "./log",
+        max_bytes: int = LOG_MAX_BYTES,
+        max_age: float = LOG_MAX_AGE,
+        backup_count: int = LOG_BACKUP_COUNT,
+        batch_size: int = LOG_BATCH_SIZE,
+        flush_interval: float = LOG_FLUSH_INTERVAL,
+    ):
         self.log_dir = log_dir
         if not os.path.isdir(self.log_dir):
             os.mkdir(self.log_dir)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.files = {
+            name: RotatingJsonl(
+                f"{self.log_dir}/{name}.jsonl", max_bytes, max_age, backup_count
+            )
+            for name in ("actions", "vision")
+        }
+        self.images = RotatingImages(
+            self.log_dir, "step*.png", max_bytes * backup_count, max_age * backup_count
+        )
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = Thread(target=self._worker, name="llm-logger", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log_vision_request(
+        self,
+        image: Image,
+        prompt: str,
+        response: str,
+        step: int,
+        duration: float = None,
+    ):
+        """Log a request-response to vision model, the image is encoded in background"""
+        record = {
+            "ts": time(),
+            "step": step,
+            "duration_ms": duration * 1000 if duration is not None else None,
+            "image": f"step{step}.png",
+            "prompt": prompt,
+            "response": response,
+        }
+        if not self._closed:
+            self._queue.put(("vision", record, image))
+
+    def log_action_request(
+        self, prompt: List[dict], response: object, duration: float = None
+    ):
+        """Log a request-response to action model"""
+        record = {
+            "ts": time(),
+            "duration_ms": duration * 1000 if duration is not None else None,
+            "prompt": prompt,
+            "response": response,
+        }
+        if not self._closed:
+            self._queue.put(("actions", record, None))
+
+    def flush(self):
+        """Block until everything queued so far is written, no-op once closed"""
+        if self._closed or not self._thread.is_alive():
+            return
+        self._queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
 
-    def log_vision_request(self, image: Image, prompt: str, response: str, step: int):
-        """Log a request-response to vision model"""
-        image.save(f"{self.log_dir}/step{step}.png")
-        with open(f"{self.log_dir}/prompt{step}.txt", "w+") as file:
-            file.write(f"Prompt: {prompt}\n-----------\nResponse: {response}")
+    def _worker(self):
+        running = True
+        while running:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            running = None not in batch
+            try:
+                self._write([item for item in batch if item is not None])
+            except Exception as e:
+                print(f"Failed to write logs: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        # release flush() callers waiting on records that raced with close()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+        for file in self.files.values():
+            file.close()
 
-    def log_action_request(self, prompt: List[dict], response: object):
-        """Log a request-response to vision model"""
-        with open(f"{self.log_dir}/actions.txt", "a") as file:
-            file.write(f"Prompt: {prompt}\n-----------\nResponse: {response}")
+    def _write(self, batch: List[Tuple[str, dict, Image]]):
+        """Encode images and append the records of a batch, one write per file"""
+        lines = {name: [] for name in self.files}
+        for name, record, image in batch:
+            if image is not None:
+                try:
+                    self.images.save(image, record["image"])
+                except Exception as e:
+                    record["image_error"] = str(e)
+            lines[name].append(json.dumps(record, default=str) + "\n")
+        for name, file_lines in lines.items():
+            if len(file_lines) > 0:
+                self.files[name].write(file_lines)
@@ -1,14 +1,10 @@
 import argparse
-from typing import Optional
-import fitz  # PyMuPDF to get page images
-from PIL import Image
 import torch
 import os
-from ocr.phi3v import Phi3V
-from kb.knowledge_base import KnowledgeBase
-from tqdm import tqdm
-
-EMBEDDING_MODEL = "mixedbread-ai/mxbai-embed-large-v1"
+from ocr.phi3v import Phi3V, OCR_MODEL_ID
+from ocr.pipeline import OcrPipeline, ocr_serial
+from ocr.store import OcrStore
+from kb.knowledge_base import KnowledgeBase, EMBEDDING_MODEL
 
 # Create the parser
 parser = argparse.ArgumentParser(description='An app to parse videogame manuals and embed it in ChromaDB')
@@ -16,49 +12,42 @@ parser = argparse.ArgumentParser(description='An app to parse videogame manuals
 # Add arguments
 parser.add_argument('--db', type=str, help='Database file for embeddings', default='embeddings.db')
 parser.add_argument('--collection', type=str, help='Collection in the database', default=None)
+parser.add_argument('--ocr-store', type=str, help='File with OCR results of all books', default='ocr_results.db')
 parser.add_argument('--file', type=str, help='PDF file of the book', required=True)
 parser.add_argument('--cpu', type=bool, help='Force workload on CPU', default=False)
-args = parser.parse_args()
+parser.add_argument('--batch', type=int, help='Pages recognized in one batch by the pipelined mode', default=1)
+parser.add_argument('--triage', action='store_true', help='Skip pages without text and recognize only the text block of a page')
+parser.add_argument('--text-layer', action='store_true', help='Take text from the PDF text layer where it is usable, OCR only the other pages')
+parser.add_argument('--workers', type=int, help='Rasterize pages in this many processes while OCR runs, 0 to process pages one by one', default=0)
+
 
-book_name = os.path.splitext(os.path.basename(args.file))[0]
-ocr_dir=os.path.dirname(args.file) + os.path.sep + book_name
-if not os.path.isdir(ocr_dir):
-    os.mkdir(ocr_dir)
-document = fitz.open(args.file)
+def main():
+    args = parser.parse_args()
+    book_name = os.path.splitext(os.path.basename(args.file))[0]
+    # page_N.txt results of older versions are imported into the store
+    ocr_dir=os.path.dirname(args.file) + os.path.sep + book_name
+    store = OcrStore(args.ocr_store)
 
-device = 'cuda' if torch.cuda.is_available() and not args.cpu else 'cpu'
-ocr = None
+    device = 'cuda' if torch.cuda.is_available() and not args.cpu else 'cpu'
 
-print("perform OCR on PDF pages...")
-full_text = []
-# Iterate through each page
-for page_number in tqdm(range(document.page_count)):
-    ocr_result_filename = ocr_dir + os.path.sep + f'page_{page_number}.txt'
-    res = ''
-    if os.path.isfile(ocr_result_filename):
-        with open(ocr_result_filename) as file:
-            res = file.read()
+    print("perform OCR on PDF pages...")
+    if args.workers > 0:
+        pipeline = OcrPipeline(args.file, store, OCR_MODEL_ID, lambda: Phi3V(device), ocr_dir=ocr_dir, workers=args.workers, batch_size=args.batch, use_triage=args.triage, use_text_layer=args.text_layer)
+        full_text = pipeline.run()
+        stats = pipeline.stats
     else:
-        page = document.load_page(page_number)
-        pix = page.get_pixmap(colorspace=fitz.csGRAY)
-        image = Image.frombytes('L', [pix.width, pix.height], pix.samples)
-        if ocr is None:
-            ocr = Phi3V(device)
-        res = ocr.recognize(image)
-    if len(res) > 0 and res != 'no text':
-        with open(ocr_dir + os.path.sep + f'page_{page_number}.txt', 'w+') as file:
-            file.write(res)
-        lines = res.splitlines()
-        for l in lines:
-            full_text.append({
-                'page': page_number,
-                'text': l.rstrip('\n')
-            })
+        full_text, stats = ocr_serial(args.file, store, OCR_MODEL_ID, lambda: Phi3V(device), ocr_dir=ocr_dir, use_triage=args.triage, use_text_layer=args.text_layer)
+    store.close()
+    print(f"OCR: {stats}")
+
+    if args.collection != None:
+        kb = KnowledgeBase(
+            path=args.db, 
+            embedding_model=EMBEDDING_MODEL,
+            device=device,
+        )
+        kb.embed(full_text, collection=args.collection, book_name=book_name)
+
 
-if args.collection != None:
-    kb = KnowledgeBase(
-        path=args.db, 
-        embedding_model=EMBEDDING_MODEL,
-        device=device,
-    )
-    kb.embed(full_text, collection=args.collection, book_name=book_name)
+if __name__ == '__main__':
+    main()
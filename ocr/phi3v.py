@@ -1,9 +1,42 @@
+import math
 import torch
+from collections import OrderedDict
 from transformers import AutoModelForCausalLM
 from transformers import AutoProcessor
 from PIL import Image
+from typing import List, Tuple
 
 VISION_MODEL = "microsoft/Phi-3-vision-128k-instruct"
+# change together with the OCR prompt, stored results of other versions are not reused
+PROMPT_VERSION = 1
+OCR_MODEL_ID = f"{VISION_MODEL}@prompt-{PROMPT_VERSION}"
+OCR_BATCH_SIZE = 4
+# the Phi-3-vision image processor cuts images into crops of this size, at most
+# MAX_CROPS of them; the number of image tokens depends only on the crop grid
+CROP_SIZE = 336
+MAX_CROPS = 16
+# tokenized prompts kept, one per crop grid
+PROMPT_CACHE_SIZE = 32
+
+
+def crop_grid(size: Tuple[int, int], max_crops: int = MAX_CROPS) -> Tuple[int, int]:
+    """
+    (columns, rows) of crops the Phi-3-vision image processor cuts an image of this size
+    into. Like its HD transform: the longer side is resized to the most crops that fit
+    max_crops with the aspect ratio kept, the shorter side is padded to whole crops.
+    """
+    width, height = size
+    transposed = width < height
+    if transposed:
+        width, height = height, width
+    ratio = width / height
+    scale = 1
+    while scale * math.ceil(scale / ratio) <= max_crops:
+        scale += 1
+    scale -= 1
+    new_height = int(scale * CROP_SIZE / ratio)
+    grid = (scale, -(-new_height // CROP_SIZE))
+    return grid[::-1] if transposed else grid
 
 class Phi3V:
     def __init__(self, device):
@@ -30,6 +63,7 @@ class Phi3V:
             {"role": "user", "content": "<|image_1|>\n\nYou are an expert OCR system. You are provided with images. You read text from images. You write only recognized text and nothing else. If there are more than one page you read all of them. You will be penalized for $1000000 for every word that is not in the image. Try not to write text from headers and footers. If there is no text on the image you just output 'no text'.\nWrite a text from the image\n"}, 
         ]
         self.prompt = self.processor.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        self.prompt_inputs = OrderedDict()
         self.generation_args = { 
             "max_new_tokens": 1024, 
             "temperature": 0.0, 
@@ -40,7 +74,57 @@ class Phi3V:
         """
         Perform image recognition
         """
-        inputs = self.processor(self.prompt, [image], return_tensors="pt").to(self.device)
+        return self.recognize_batch([image])[0]
+
+    def recognize_batch(self, images: List[Image], batch_size: int = OCR_BATCH_SIZE) -> List[str]:
+        """
+        Perform recognition of many images, one generate call per batch of images with the
+        same crop grid (see crop_grid), so their prompts have the same number of image
+        tokens. Images are not changed. Results are in the order of images.
+        """
+        groups = {}
+        for i, image in enumerate(images):
+            groups.setdefault(crop_grid(image.size), []).append(i)
+        results = [None] * len(images)
+        for indices in groups.values():
+            for start in range(0, len(indices), batch_size):
+                batch = indices[start:start + batch_size]
+                texts = self._generate(self._batch_inputs([images[i] for i in batch]))
+                for i, text in zip(batch, texts):
+                    results[i] = text
+        return results
+
+    def _prompt_inputs(self, image: Image):
+        """
+        Tokenized prompt for images with the crop grid of this one. The prompt is constant
+        and the number of image tokens depends only on the crop grid, so it is computed
+        once per grid and the latest PROMPT_CACHE_SIZE grids are kept.
+        """
+        grid = crop_grid(image.size)
+        inputs = self.prompt_inputs.get(grid)
+        if inputs is None:
+            inputs = self.processor(self.prompt, [image], return_tensors="pt")
+            inputs = (inputs['input_ids'], inputs['attention_mask'])
+            self.prompt_inputs[grid] = inputs
+            while len(self.prompt_inputs) > PROMPT_CACHE_SIZE:
+                self.prompt_inputs.popitem(last=False)
+        else:
+            self.prompt_inputs.move_to_end(grid)
+        return inputs
+
+    def _batch_inputs(self, images: List[Image]) -> dict:
+        """Model inputs for images of the same crop grid, rows have equal length"""
+        input_ids, attention_mask = self._prompt_inputs(images[0])
+        pixels = self.processor.image_processor(images, return_tensors="pt")
+        inputs = {
+            'input_ids': input_ids.repeat(len(images), 1),
+            'attention_mask': attention_mask.repeat(len(images), 1),
+            'pixel_values': pixels['pixel_values'],
+            'image_sizes': pixels['image_sizes'],
+        }
+        return {key: value.to(self.device) for key, value in inputs.items()}
+
+    def _generate(self, inputs: dict) -> List[str]:
         generate_ids = self.model.generate(
             **inputs, 
             eos_token_id=self.processor.tokenizer.eos_token_id,
@@ -48,9 +132,8 @@ class Phi3V:
         )
         generate_ids = generate_ids[:, inputs['input_ids'].shape[1]:]
 
-        response = self.processor.batch_decode(
+        return self.processor.batch_decode(
             generate_ids, 
             skip_special_tokens=True, 
             clean_up_tokenization_spaces=False
-        )[0]
-        return response
\ No newline at end of file
+        )
@@ -0,0 +1,382 @@
+import os
+import queue
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from threading import Thread
+from time import perf_counter
+from typing import Callable, List, Optional, Tuple
+import fitz  # PyMuPDF to get page images
+from PIL import Image
+from tqdm import tqdm
+from ocr.store import OcrStore, page_key, raster_digest
+from ocr.triage import TRIAGE_VERSION, triage
+from ocr.text_layer import extract_text_layer
+
+NO_TEXT = 'no text'
+RASTER_AHEAD = 8
+WRITE_BATCH = 32
+
+_document = None
+# what the pool needs to tell pages to recognize, see _Lookup.add
+_model_id = None
+_stored = frozenset()
+_legacy = frozenset()
+
+
+def legacy_page_filename(ocr_dir: str, page_number: int) -> str:
+    return ocr_dir + os.path.sep + f'page_{page_number}.txt'
+
+
+def read_legacy_page(ocr_dir: Optional[str], page_number: int) -> Optional[str]:
+    """Result saved as page_N.txt by ocr.py before the OCR store, or None"""
+    if ocr_dir is None:
+        return None
+    filename = legacy_page_filename(ocr_dir, page_number)
+    if not os.path.isfile(filename):
+        return None
+    with open(filename) as file:
+        return file.read()
+
+
+def page_lines(page_number: int, res: str, source: str) -> List[dict]:
+    """
+    Records {'page', 'text', 'source'} of a page for KnowledgeBase.embed, source is the
+    path that produced the page text (see _Lookup)
+    """
+    if len(res) == 0 or res == NO_TEXT:
+        return []
+    return [{'page': page_number, 'text': l.rstrip('\n'), 'source': source} for l in res.splitlines()]
+
+
+def triage_model_id(model_id: str, use_triage: bool) -> str:
+    """Results of triaged pages differ from whole page ones and are stored apart"""
+    return f'{model_id}+triage-{TRIAGE_VERSION}' if use_triage else model_id
+
+
+def inspect_page(document, page_number: int, use_text_layer: bool) -> Tuple[Optional[str], Optional[str], object]:
+    """
+    (None, text, None) of a page with a usable text layer, otherwise (raster digest,
+    None, grayscale pixmap). The pixmap is the only rasterization of the page.
+    """
+    page = document.load_page(page_number)
+    if use_text_layer:
+        text = extract_text_layer(page)
+        if text is not None:
+            return None, text, None
+    pix = page.get_pixmap(colorspace=fitz.csGRAY)
+    return raster_digest(pix.width, pix.height, pix.samples), None, pix
+
+
+def prepare_page(pix, use_triage: bool) -> Tuple[Optional[Image.Image], dict]:
+    """Image to recognize from the page pixmap, None for a page skipped by triage, and its triage info"""
+    image = Image.frombytes('L', [pix.width, pix.height], pix.samples)
+    pixels = image.width * image.height
+    if not use_triage:
+        return image, {'skipped': False, 'input_pixels': pixels, 'model_pixels': pixels}
+    result = triage(image)
+    return result.image, {'skipped': result.skip, 'input_pixels': pixels, 'model_pixels': result.output_pixels}
+
+
+def _open_document(path: str, model_id: str, stored: frozenset, legacy: frozenset):
+    global _document, _model_id, _stored, _legacy
+    _document = fitz.open(path)
+    _model_id, _stored, _legacy = model_id, stored, legacy
+
+
+def _process_in_worker(
+    page_number: int, use_text_layer: bool, use_triage: bool
+) -> Tuple[int, Optional[str], Optional[str], Optional[Image.Image], Optional[dict], float, float]:
+    """
+    Runs in a pool process: hashes the page and, if it has to be recognized, prepares
+    the image from the same pixmap. Only pages to recognize send an image back.
+    """
+    start = perf_counter()
+    digest, text, pix = inspect_page(_document, page_number, use_text_layer)
+    hash_time = perf_counter() - start
+    if text is not None or page_number in _legacy or page_key(digest, _model_id) in _stored:
+        return page_number, digest, text, None, None, hash_time, 0.0
+    start = perf_counter()
+    image, info = prepare_page(pix, use_triage)
+    return page_number, digest, None, image, info, hash_time, perf_counter() - start
+
+
+class _Lookup:
+    """
+    Where the text of every page of a book comes from. The stored keys of the model are
+    read once up front, so a page is known to be stored as soon as it is hashed; the
+    stored texts are read in one query by finish().
+    sources tells for every page where its text comes from: 'text_layer' (the PDF),
+    'store' (OCR of an earlier run), 'legacy' (page_N.txt), 'ocr' or 'triage' (skipped
+    as without text).
+    """
+
+    def __init__(self, store: OcrStore, model_id: str, ocr_dir: Optional[str], page_count: int):
+        self.store = store
+        self.model_id = model_id
+        self.ocr_dir = ocr_dir
+        self.stored = store.keys(page_key('', model_id))
+        self.legacy = frozenset(
+            page_number for page_number in range(page_count)
+            if ocr_dir is not None and os.path.isfile(legacy_page_filename(ocr_dir, page_number))
+        )
+        self.keys = {}
+        self.texts = {}
+        self.sources = {}
+        self.todo = []
+        self.text_layer = 0
+        self.cached = 0
+        self.imported = 0
+        self._stored_pages = []
+        self._imported = []
+
+    def add(self, page_number: int, digest: Optional[str], text: Optional[str]) -> bool:
+        """Take the result of inspect_page(), True if the page has to be recognized"""
+        if text is not None:
+            self.set(page_number, text, 'text_layer')
+            self.text_layer += 1
+            return False
+        key = page_key(digest, self.model_id)
+        self.keys[page_number] = key
+        if key in self.stored:
+            self._stored_pages.append(page_number)
+            return False
+        res = read_legacy_page(self.ocr_dir, page_number) if page_number in self.legacy else None
+        if res is not None:
+            self.set(page_number, res, 'legacy')
+            self._imported.append((key, res))
+            return False
+        self.todo.append(page_number)
+        return True
+
+    def finish(self):
+        """Read the texts of stored pages and import the legacy ones into the store"""
+        found = self.store.get_many(self.keys[page_number] for page_number in self._stored_pages)
+        for page_number in self._stored_pages:
+            self.set(page_number, found[self.keys[page_number]], 'store')
+        self.store.put_many(self._imported)
+        self.cached = len(self._stored_pages)
+        self.imported = len(self._imported)
+
+    def set(self, page_number: int, res: str, source: str):
+        self.texts[page_number] = res
+        self.sources[page_number] = source
+
+    def full_text(self) -> List[dict]:
+        full_text = []
+        for page_number in sorted(self.texts):
+            full_text.extend(page_lines(page_number, self.texts[page_number], self.sources[page_number]))
+        return full_text
+
+
+def _new_stats(pages: int) -> dict:
+    return {
+        'pages': pages, 'text_layer': 0, 'cached': 0, 'imported': 0, 'skipped': 0, 'input_pixels': 0, 'model_pixels': 0,
+        'hash_s': 0.0, 'raster_s': 0.0, 'ocr_s': 0.0, 'write_s': 0.0,
+    }
+
+
+def _count_triage(stats: dict, info: dict):
+    stats['skipped'] += int(info['skipped'])
+    stats['input_pixels'] += info['input_pixels']
+    stats['model_pixels'] += info['model_pixels']
+
+
+def ocr_serial(
+    pdf_path: str,
+    store: OcrStore,
+    model_id: str,
+    recognizer: Callable[[], object],
+    ocr_dir: str = None,
+    use_triage: bool = False,
+    use_text_layer: bool = False,
+) -> Tuple[List[dict], dict]:
+    """
+    Recognize pages one at a time. Every page is rasterized once and looked up in the
+    store, the recognizer is created only if some page is missing.
+    recognizer - creates the object with recognize(image)
+    ocr_dir - directory with page_N.txt of older runs, imported into the store
+    use_triage - skip pages without text and recognize only the cropped text block
+    use_text_layer - take the text of pages with a usable PDF text layer without OCR
+    """
+    model_id = triage_model_id(model_id, use_triage)
+    start = perf_counter()
+    with fitz.open(pdf_path) as document:
+        stats = _new_stats(document.page_count)
+        lookup = _Lookup(store, model_id, ocr_dir, document.page_count)
+        ocr = None
+        for page_number in tqdm(range(document.page_count)):
+            t = perf_counter()
+            digest, text, pix = inspect_page(document, page_number, use_text_layer)
+            stats['hash_s'] += perf_counter() - t
+            if not lookup.add(page_number, digest, text):
+                continue
+            t = perf_counter()
+            image, info = prepare_page(pix, use_triage)
+            stats['raster_s'] += perf_counter() - t
+            _count_triage(stats, info)
+            if image is None:
+                lookup.set(page_number, NO_TEXT, 'triage')
+            else:
+                if ocr is None:
+                    ocr = recognizer()
+                t = perf_counter()
+                lookup.set(page_number, ocr.recognize(image), 'ocr')
+                stats['ocr_s'] += perf_counter() - t
+            res = lookup.texts[page_number]
+            t = perf_counter()
+            store.put_many([(lookup.keys[page_number], res)])
+            stats['write_s'] += perf_counter() - t
+    lookup.finish()
+    stats['text_layer'], stats['cached'], stats['imported'] = lookup.text_layer, lookup.cached, lookup.imported
+    stats['wall_s'] = perf_counter() - start
+    return lookup.full_text(), _rates(stats)
+
+
+class OcrPipeline:
+    """
+    Pipelined OCR of a PDF: a process pool rasterizes every page once, up to raster_ahead
+    pages ahead of the recognizer, hashes it against the keys already in the store and
+    prepares the image of the pages to recognize from the same raster.
+    The recognizer runs on the calling thread (it owns the model) and results are stored
+    by a writer thread. The resulting full_text is the same, page ordered, as with
+    ocr_serial.
+    batch_size - pages passed at once to recognize_batch of the recognizer
+    use_triage - skip pages without text and recognize only the cropped text block,
+    triage runs in the pool
+    use_text_layer - take the text of pages with a usable PDF text layer without OCR
+    """
+
+    def __init__(
+        self,
+        pdf_path: str,
+        store: OcrStore,
+        model_id: str,
+        recognizer: Callable[[], object],
+        ocr_dir: str = None,
+        workers: int = 2,
+        raster_ahead: int = RASTER_AHEAD,
+        batch_size: int = 1,
+        use_triage: bool = False,
+        use_text_layer: bool = False,
+    ):
+        self.pdf_path = pdf_path
+        self.use_text_layer = use_text_layer
+        self.store = store
+        self.use_triage = use_triage
+        self.model_id = triage_model_id(model_id, use_triage)
+        self.recognizer = recognizer
+        self.ocr_dir = ocr_dir
+        self.workers = workers
+        self.batch_size = batch_size
+        self.raster_ahead = max(raster_ahead, workers, batch_size)
+        self.stats = {}
+        self._write_error = None
+
+    def run(self) -> List[dict]:
+        with fitz.open(self.pdf_path) as document:
+            page_count = document.page_count
+        self.stats = _new_stats(page_count)
+        self._write_error = None
+        start = perf_counter()
+        lookup = _Lookup(self.store, self.model_id, self.ocr_dir, page_count)
+        writes = queue.Queue(maxsize=self.raster_ahead)
+        writer = Thread(target=self._writer, args=(writes,), name='ocr-writer', daemon=True)
+        writer.start()
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_open_document,
+                initargs=(self.pdf_path, self.model_id, lookup.stored, lookup.legacy),
+            ) as pool:
+                self._recognize(pool, lookup, writes, page_count)
+        finally:
+            writes.put(None)
+            writer.join()
+        if self._write_error is not None:
+            raise self._write_error
+        lookup.finish()
+        self.stats['text_layer'] = lookup.text_layer
+        self.stats['cached'], self.stats['imported'] = lookup.cached, lookup.imported
+        self.stats['wall_s'] = perf_counter() - start
+        self.stats = _rates(self.stats)
+        return lookup.full_text()
+
+    def _recognize(self, pool, lookup: _Lookup, writes: queue.Queue, page_count: int):
+        pages = iter(range(page_count))
+        submit = lambda page_number: pool.submit(_process_in_worker, page_number, self.use_text_layer, self.use_triage)
+        pending = deque(submit(page_number) for page_number in islice(pages, self.raster_ahead))
+        ocr = None
+        progress = tqdm(total=page_count)
+        while len(pending) > 0:
+            batch = []
+            while len(pending) > 0 and len(batch) < self.batch_size:
+                page_number, digest, text, image, info, hash_time, raster_time = pending.popleft().result()
+                next_page = next(pages, None)
+                if next_page is not None:
+                    pending.append(submit(next_page))
+                self.stats['hash_s'] += hash_time
+                if not lookup.add(page_number, digest, text):
+                    progress.update()
+                    continue
+                self.stats['raster_s'] += raster_time
+                _count_triage(self.stats, info)
+                if image is None:
+                    lookup.set(page_number, NO_TEXT, 'triage')
+                    writes.put((lookup.keys[page_number], NO_TEXT))
+                    progress.update()
+                else:
+                    batch.append((page_number, image))
+            if len(batch) == 0:
+                continue
+            if ocr is None:
+                ocr = self.recognizer()
+            t = perf_counter()
+            if len(batch) > 1:
+                results = ocr.recognize_batch([image for _, image in batch])
+            else:
+                results = [ocr.recognize(batch[0][1])]
+            self.stats['ocr_s'] += perf_counter() - t
+            for (page_number, _), res in zip(batch, results):
+                lookup.set(page_number, res, 'ocr')
+                writes.put((lookup.keys[page_number], res))
+            progress.update(len(batch))
+        progress.close()
+
+    def _writer(self, writes: queue.Queue):
+        running = True
+        while running:
+            items = [writes.get()]
+            while len(items) < WRITE_BATCH:
+                try:
+                    items.append(writes.get_nowait())
+                except queue.Empty:
+                    break
+            running = None not in items
+            items = [item for item in items if item is not None]
+            if len(items) == 0 or self._write_error is not None:
+                # after an error keep draining so the recognizer is never blocked
+                continue
+            t = perf_counter()
+            try:
+                self.store.put_many(items)
+            except Exception as e:
+                self._write_error = e
+            self.stats['write_s'] += perf_counter() - t
+
+
+def _rates(stats: dict) -> dict:
+    """
+    Add pages per second of every stage, busy time of a stage is summed over its workers.
+    Hashing includes the rasterization of a page, raster is the preparation of the image
+    of the pages to recognize.
+    """
+    processed = stats['pages'] - stats['text_layer'] - stats['cached'] - stats['imported']
+    if stats['input_pixels'] > 0:
+        stats['model_input_saved'] = 1 - stats['model_pixels'] / stats['input_pixels']
+    stats['hash_pages_per_s'] = stats['pages'] / stats['hash_s'] if stats['hash_s'] > 0 else None
+    for stage in ('raster', 'ocr', 'write'):
+        busy = stats[f'{stage}_s']
+        stats[f'{stage}_pages_per_s'] = processed / busy if busy > 0 else None
+    stats['pages_per_s'] = stats['pages'] / stats['wall_s'] if stats['wall_s'] > 0 else None
+    return stats
@@ -0,0 +1,78 @@
+import hashlib
+import sqlite3
+from threading import Lock
+from time import time
+from typing import Dict, Iterable, List, Tuple
+
+# SQLite limits the number of variables of a statement
+LOOKUP_CHUNK = 500
+
+
+def raster_digest(width: int, height: int, samples: bytes) -> str:
+    """Hash of a rasterized page, changes with the PDF content and the rendering"""
+    digest = hashlib.blake2b(samples, digest_size=16)
+    digest.update(f'{width}x{height}'.encode())
+    return digest.hexdigest()
+
+
+def page_key(digest: str, model_id: str) -> str:
+    """Store key of a page: its raster digest and the model with its prompt version"""
+    return f'{model_id}:{digest}'
+
+
+class OcrStore:
+    """
+    OCR results of all books in one SQLite file, keyed by page_key().
+    Negative results ('no text') are stored as well so they are not recognized again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, text TEXT NOT NULL, created REAL NOT NULL)')
+        self._db.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Results of the given keys found in the store"""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), LOOKUP_CHUNK):
+                chunk = keys[start:start + LOOKUP_CHUNK]
+                rows = self._db.execute(
+                    f'SELECT key, text FROM results WHERE key IN ({",".join("?" * len(chunk))})',
+                    chunk,
+                )
+                found.update(rows)
+        return found
+
+    def keys(self, prefix: str) -> frozenset:
+        """Stored keys starting with prefix, page_key('', model_id) gives all pages of a model"""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT key FROM results WHERE key >= ? AND key < ?',
+                (prefix, prefix + '\uffff'),
+            )
+            return frozenset(key for key, in rows)
+
+    def put_many(self, items: List[Tuple[str, str]]):
+        """Store (key, text) pairs in one transaction"""
+        if len(items) == 0:
+            return
+        now = time()
+        with self._lock:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO results (key, text, created) VALUES (?, ?, ?)',
+                [(key, text, now) for key, text in items],
+            )
+            self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,50 @@
+import re
+from typing import Optional
+import fitz  # PyMuPDF to get page text
+
+# pages with less extracted text go to OCR
+MIN_TEXT_CHARS = 40
+# share of characters that must be printable and not the replacement character
+MIN_PRINTABLE = 0.97
+# share of whitespace separated tokens that must contain a word of two letters or more
+MIN_WORDS = 0.5
+# a page covered by images above this share is a scan unless its text covers at least
+# MIN_TEXT_COVERAGE of the image area
+SCAN_IMAGE_COVERAGE = 0.5
+MIN_TEXT_COVERAGE = 0.2
+
+WORD = re.compile(r'[^\W\d_]{2,}')
+
+
+def _area(rect: fitz.Rect, clip: fitz.Rect) -> float:
+    rect = fitz.Rect(rect) & clip
+    return 0.0 if rect.is_empty else rect.width * rect.height
+
+
+def text_quality(text: str) -> float:
+    """Share of tokens that look like words, 0 for garbled or too short text"""
+    if len(text) < MIN_TEXT_CHARS:
+        return 0.0
+    printable = sum(1 for c in text if (c.isprintable() or c.isspace()) and c != '�')
+    if printable < MIN_PRINTABLE * len(text):
+        return 0.0
+    tokens = text.split()
+    return sum(1 for t in tokens if WORD.search(t)) / len(tokens)
+
+
+def extract_text_layer(page) -> Optional[str]:
+    """
+    Text of the embedded text layer of a PDF page, or None when the page has to be
+    recognized: no or garbled text, or a scanned page with only a little text on it.
+    """
+    text = page.get_text('text').strip()
+    if text_quality(text) < MIN_WORDS:
+        return None
+    clip = page.rect
+    page_area = clip.width * clip.height
+    image_area = sum(_area(info['bbox'], clip) for info in page.get_image_info())
+    if image_area > SCAN_IMAGE_COVERAGE * page_area:
+        text_area = sum(_area(block[:4], clip) for block in page.get_text('blocks') if block[6] == 0)
+        if text_area < MIN_TEXT_COVERAGE * image_area:
+            return None
+    return text
@@ -0,0 +1,116 @@
+import cv2
+import numpy as np
+from PIL import Image
+from typing import Optional, Tuple
+
+# change when the triage rules change, stored OCR results depend on them
+TRIAGE_VERSION = 1
+# pages with a smaller range of gray levels are blank
+BLANK_RANGE = 16
+# pages with less ink than this fraction of pixels are blank
+MIN_INK = 0.002
+# pages with fewer glyph-sized components have no text to read (artwork, blank)
+MIN_GLYPHS = 12
+# glyph-sized connected components, in pixels
+GLYPH_MIN_HEIGHT = 3
+GLYPH_MAX_HEIGHT = 80
+GLYPH_MAX_WIDTH = 120
+# a line band this close to the page edge, separated by a gap of HEADER_GAP line
+# heights from the text block, is a header or footer
+HEADER_ZONE = 0.12
+HEADER_GAP = 2.0
+CROP_PADDING = 8
+# longer page sides are downscaled to this
+MAX_SIDE = 1344
+
+
+class TriageResult:
+    """Outcome of page triage: skip the page or recognize the reduced image"""
+
+    def __init__(self, image: Optional[Image.Image], reason: str, input_pixels: int, box: Tuple[int, int, int, int] = None):
+        self.image = image
+        self.reason = reason
+        self.box = box
+        self.input_pixels = input_pixels
+        self.output_pixels = image.width * image.height if image is not None else 0
+
+    @property
+    def skip(self) -> bool:
+        return self.image is None
+
+
+def _ink(gray: np.ndarray) -> np.ndarray:
+    """Binary mask of dark pixels, Otsu threshold on the page histogram"""
+    _, ink = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return ink
+
+
+def _line_bands(tops: np.ndarray, bottoms: np.ndarray, height: int) -> list:
+    """(top, bottom) row ranges covered by components spanning rows tops..bottoms"""
+    coverage = np.zeros(height + 1, dtype=np.int32)
+    np.add.at(coverage, tops, 1)
+    np.add.at(coverage, bottoms + 1, -1)
+    rows = np.flatnonzero(np.cumsum(coverage[:-1]) > 0)
+    if rows.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(rows) > 1)
+    starts = np.concatenate(([rows[0]], rows[breaks + 1]))
+    ends = np.concatenate((rows[breaks], [rows[-1]]))
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def _drop_header_footer(bands: list, height: int) -> list:
+    if len(bands) < 3:
+        return bands
+    line_height = float(np.median([bottom - top + 1 for top, bottom in bands]))
+    top, bottom = bands[0]
+    if bottom < height * HEADER_ZONE and bands[1][0] - bottom > HEADER_GAP * line_height:
+        bands = bands[1:]
+    top, bottom = bands[-1]
+    if len(bands) >= 3 and top > height * (1 - HEADER_ZONE) and top - bands[-2][1] > HEADER_GAP * line_height:
+        bands = bands[:-1]
+    return bands
+
+
+def triage(image: Image.Image) -> TriageResult:
+    """
+    Decide from ink density and connected components whether a page has text; crop it to
+    the text block without header and footer and downscale it to at most MAX_SIDE.
+    """
+    gray = np.asarray(image.convert('L'))
+    input_pixels = gray.size
+    low, high, _, _ = cv2.minMaxLoc(gray)
+    if high - low < BLANK_RANGE:
+        return TriageResult(None, 'blank', input_pixels)
+    ink = _ink(gray)
+    if cv2.countNonZero(ink) < MIN_INK * input_pixels:
+        return TriageResult(None, 'blank', input_pixels)
+
+    _, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    stats = stats[1:]
+    widths, heights = stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT]
+    glyphs = stats[(heights >= GLYPH_MIN_HEIGHT) & (heights <= GLYPH_MAX_HEIGHT) & (widths <= GLYPH_MAX_WIDTH)]
+    if len(glyphs) < MIN_GLYPHS:
+        return TriageResult(None, 'no text', input_pixels)
+
+    tops = glyphs[:, cv2.CC_STAT_TOP]
+    bottoms = tops + glyphs[:, cv2.CC_STAT_HEIGHT] - 1
+    bands = _drop_header_footer(_line_bands(tops, bottoms, gray.shape[0]), gray.shape[0])
+    top, bottom = bands[0][0], bands[-1][1]
+    inside = glyphs[(tops >= top) & (bottoms <= bottom)]
+    left = inside[:, cv2.CC_STAT_LEFT].min()
+    right = (inside[:, cv2.CC_STAT_LEFT] + inside[:, cv2.CC_STAT_WIDTH]).max() - 1
+    box = (
+        max(int(left) - CROP_PADDING, 0),
+        max(int(top) - CROP_PADDING, 0),
+        min(int(right) + CROP_PADDING + 1, gray.shape[1]),
+        min(int(bottom) + CROP_PADDING + 1, gray.shape[0]),
+    )
+    reduced = image.crop(box)
+    scale = MAX_SIDE / max(reduced.size)
+    if scale < 1:
+        reduced = reduced.resize(
+            (max(round(reduced.width * scale), 1), max(round(reduced.height * scale), 1)),
+            Image.LANCZOS,
+        )
+    return TriageResult(reduced, 'text', input_pixels, box)
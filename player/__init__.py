@@ -1,98 +1,412 @@
-import pyautogui
 import os
 from typing import Tuple
 from player.types import MoveDirection, TurnDirection, GlobalDirection, Action, EAction
 from player.smart_controller import SmartController
-from player.vision import VisionModel
+from player.vision import VisionModel, SegmentationResult
 from player.state import PlayerState
+from player.capture import FrameSource
+from player.environment import GameEnvironment, PyAutoGuiEnvironment
+from player.settle import (
+    ViewSettler,
+    SETTLE_THRESHOLD,
+    SETTLE_TIMEOUT,
+    view_thumbnail,
+)
+from player.segment_cache import SegmentationCache
+from player.locator import ButtonLocator, CALIBRATION_FILE, to_gray
+from player.pipeline import StepPipeline, StepJob
+from player.mosaic import LookaroundMosaic
+from player.intent import IntentCache
+from player.gridmap import BLOCKED, FREE, front_blocked, move_delta, path_actions
+from player.history import ActionHistory, HISTORY_DEPTH
+from player.snapshot import dump_snapshot, load_snapshot
 from llm_logger import LLMLogger
 from PIL import Image, ImageDraw, ImageFont
-from time import sleep
+from time import perf_counter, sleep
+import numpy as np
 
 VIEW_CHANGE_SLEEP = 0.3
+GAMEVIEW_BOX = (7, 67, 455, 338)
+GAMEVIEW_SIZE = (GAMEVIEW_BOX[2] - GAMEVIEW_BOX[0], GAMEVIEW_BOX[3] - GAMEVIEW_BOX[1])
+# Screenshots skip the top of the window (title and menu bar)
+SCREEN_TOP_OFFSET = 50
+# directions seen while turning right in place
+LOOKAROUND_ORDER = ("forward", "right", "back", "left")
+MANUAL_TOPK = 3
+MAX_GOTO_STEPS = 200
+# shortest pause between two inputs of a macro the game still takes as two inputs.
+# 0.05 s is not measured on DOSBox-X yet: Player.measure_key_delay() finds it (the app
+# with MACRO_KEY_DELAY=measure), record the result here. The simulator with
+# min_key_interval=0.03 measures 0.03.
+MACRO_KEY_DELAY = 0.05
+# pauses tried by measure_key_delay, slowest first
+KEY_DELAY_CANDIDATES = (0.2, 0.1, 0.05, 0.03, 0.02, 0.01, 0.0)
+TURN_CHANGES = {TurnDirection.LEFT: 1, TurnDirection.RIGHT: -1, TurnDirection.AROUND: 2}
+STATE_FILE = "state.bin"
+
+
+class GotoError(Exception):
+    """The goto target is not explored or cannot be reached"""
 
 
 class Player:
     """Class to represent an AI player for a game"""
 
-    def __init__(self, game_controller_model: str):
-        """Initialize the player."""
+    def __init__(
+        self,
+        game_controller_model: str,
+        frame_source: FrameSource = None,
+        adaptive_settle: bool = False,
+        settle_timeout: float = SETTLE_TIMEOUT,
+        segment_cache: SegmentationCache = None,
+        calibration_file: str = CALIBRATION_FILE,
+        pipelined: bool = False,
+        intent_cache: IntentCache = None,
+        knowledge_base=None,
+        manual_collection: str = None,
+        macro: bool = False,
+        macro_checkpoint: int = 0,
+        history_depth: int = HISTORY_DEPTH,
+        environment: GameEnvironment = None,
+        macro_key_delay: float = None,
+    ):
+        """
+        Initialize the player.
+        adaptive_settle - wait until the game view stops changing after an input
+        instead of sleeping VIEW_CHANGE_SLEEP
+        segment_cache - cache for gameview segmentations, in-memory only by default
+        calibration_file - where found UI button positions are kept between runs
+        pipelined - capture and segment on a worker thread, call sync() before
+        reading screen or state.segments
+        intent_cache - cache of phrases already resolved by the LLM
+        knowledge_base - kb.KnowledgeBase searched by the read_manual tool
+        manual_collection - collection of the game manual in knowledge_base
+        macro - execute consecutive move/turn tools as one macro observed at the end
+        macro_checkpoint - observe and verify a macro every this many inputs, 0 never
+        history_depth - latest actions kept in history
+        environment - window, input and frames of the game, a DOSBox-X window driven
+        with pyautogui by default
+        macro_key_delay - pause between the inputs of a macro, MACRO_KEY_DELAY for a
+        real-time game and none for a simulated one by default
+        """
         self.video_game_name = "Dungeon Master"
         self.state = PlayerState()
-        self.history = []
+        self.history = ActionHistory(history_depth)
+        # milliseconds taken by the last save_state and load_state
+        self.snapshot_ms = {"save": 0.0, "load": 0.0}
+        self.knowledge_base = knowledge_base
+        self.manual_collection = manual_collection
+        self.manual_results = []
+        # tools of the model that failed: {"tool", "arguments", "error"}
+        self.tool_errors = []
+        self.macro = macro
+        self.macro_checkpoint = macro_checkpoint
+        self.macro_stats = {"macros": 0, "inputs": 0, "observations": 0, "fallbacks": 0}
         self.logger = LLMLogger()
         self.smc = SmartController(
             video_game_name=self.video_game_name,
             model=game_controller_model,
             logger=self.logger,
+            intent_cache=intent_cache,
         )
-        dosbox = pyautogui.getWindowsWithTitle("DOSBox-X")
+        self.environment = (
+            environment if environment is not None else PyAutoGuiEnvironment()
+        )
+        # a simulated game shows the result of an input at once
+        self.view_change_sleep = VIEW_CHANGE_SLEEP if self.environment.realtime else 0.0
+        if macro_key_delay is None:
+            macro_key_delay = MACRO_KEY_DELAY if self.environment.realtime else 0.0
+        self.macro_key_delay = macro_key_delay
+        dosbox = self.environment.windows("DOSBox-X")
         if len(dosbox) < 1:
             raise Exception("Window with game not found!")
         self.dosbox_window = dosbox[0]
+        self.frame_source = (
+            frame_source
+            if frame_source is not None
+            else self.environment.frame_source()
+        )
+        self.settler = (
+            ViewSettler(self.make_screenshot, GAMEVIEW_BOX, timeout=settle_timeout)
+            if adaptive_settle
+            else None
+        )
+        self.locator = ButtonLocator(calibration_file=calibration_file)
+        self.ui_geometry = ButtonLocator.geometry_key(
+            self.dosbox_window.width, self.dosbox_window.height
+        )
+        # positions checked during this session and the ones saved by previous runs
         self.ui_buttons_cache = {}
+        self.ui_buttons_calibration = self.locator.load_calibration(self.ui_geometry)
         self.screen = None
-        self.segmentview = None
+        self._last_capture = None
+        self.mosaic = None
         self.vision = VisionModel(
             video_game_name=self.video_game_name,
             logger=self.logger,
+            cache=segment_cache if segment_cache is not None else SegmentationCache(),
+        )
+        self.pipeline = (
+            StepPipeline(
+                capture=self._capture_view,
+                process=self._segment_screen,
+                apply=self._apply_step,
+            )
+            if pipelined
+            else None
         )
         self.next_step()
+        self.sync()
 
-    def action_text(self, action: str):
-        """Perform an action based on the given text."""
+    def action_text(self, action: str, stream: bool = False):
+        """
+        Perform an action based on the given text.
+        stream - execute every tool as soon as the model has generated it
+        """
+        if stream:
+            tools = []
+            for tool in self.smc.parse_action_phrase_stream(action):
+                self._execute_ai_tool(tool)
+                tools.append(tool)
+            return tools
         tools = self.smc.parse_action_phrase(action)
-        for tool in tools:
-            self._execute_ai_tool(tool)
+        self._prefetch_manual(tools)
+        if not self.macro:
+            for tool in tools:
+                self._execute_ai_tool(tool)
+            return tools
+        actions = []
+        for tool in tools + [None]:
+            if tool is not None and tool.name == "move":
+                actions.append(("move", MoveDirection(tool.arguments["direction"])))
+            elif tool is not None and tool.name == "turn":
+                actions.append(("turn", TurnDirection(tool.arguments["direction"])))
+            else:
+                if len(actions) > 0:
+                    self.run_macro(actions)
+                    actions = []
+                if tool is not None:
+                    self._execute_ai_tool(tool)
         return tools
 
+    def run_macro(self, actions: list, checkpoint_every: int = None):
+        """
+        Send ("move" | "turn", direction) actions macro_key_delay apart, updating the
+        state arithmetically, and observe the view once at the end. Every
+        checkpoint_every inputs the view is checked against the expected pose; on a
+        mismatch the rest of the actions is executed step by step.
+        """
+        if checkpoint_every is None:
+            checkpoint_every = self.macro_checkpoint
+        self.macro_stats["macros"] += 1
+        self.sync()
+        checkpoint_pose = (self.state.coordinates, self.state.direction)
+        for i, (kind, direction) in enumerate(actions):
+            if i > 0:
+                sleep(self.macro_key_delay)
+            self._input(kind, direction)
+            self.macro_stats["inputs"] += 1
+            if i == len(actions) - 1:
+                break
+            if checkpoint_every > 0 and (i + 1) % checkpoint_every == 0:
+                if not self._checkpoint(checkpoint_pose):
+                    self.macro_stats["fallbacks"] += 1
+                    for kind, direction in actions[i + 1 :]:
+                        self._execute_action(kind, direction)
+                    return
+                checkpoint_pose = (self.state.coordinates, self.state.direction)
+        self._observe()
+
+    def measure_key_delay(
+        self, delays: Tuple[float, ...] = KEY_DELAY_CANDIDATES, presses: int = 3
+    ) -> float:
+        """
+        Find the shortest pause between inputs that the game still takes as separate
+        inputs. At every delay, slowest first, turn right with the given number of
+        presses (a few more if the views look alike) and check that the view turned
+        that far. Returns the last delay before the first one that lost an input.
+        The party ends facing where it started; the state is not changed.
+        """
+        self.sync()
+        slow = max(delays)
+        # views after 0 to 3 right turns, pressed slowly
+        references = []
+        for _ in range(len(GlobalDirection)):
+            references.append(view_thumbnail(self._capture_view(), GAMEVIEW_BOX))
+            sleep(slow)
+            self.press_button("turnright")
+        # press more times if the view after that many turns looks like another one
+        for count in range(presses, presses + len(references)):
+            expected = count % len(references)
+            if expected != 0 and all(
+                np.abs(references[expected] - reference).mean() > SETTLE_THRESHOLD
+                for i, reference in enumerate(references)
+                if i != expected
+            ):
+                trial_presses = count
+                break
+        else:
+            raise Exception("The views look alike, cannot measure the key delay here!")
+        measured = None
+        for delay in sorted(delays, reverse=True):
+            sleep(slow)
+            for i in range(trial_presses):
+                if i > 0:
+                    sleep(delay)
+                self.press_button("turnright")
+            view = view_thumbnail(self._capture_view(), GAMEVIEW_BOX)
+            turned = int(
+                np.argmin([np.abs(view - reference).mean() for reference in references])
+            )
+            for _ in range(-turned % len(references)):
+                sleep(slow)
+                self.press_button("turnright")
+            if turned != expected:
+                break
+            measured = delay
+        self._capture_view()
+        if measured is None:
+            raise Exception("Inputs are lost even at the slowest key delay!")
+        return measured
+
+    def _execute_action(self, kind: str, direction):
+        if kind == "move":
+            self.move(direction)
+        else:
+            self.turn(direction)
+
+    def _input(self, kind: str, direction):
+        """Press the input of an action and update the state, without observing"""
+        if kind == "move":
+            self.press_button(direction.value)
+            self._apply_move(direction)
+        else:
+            self._press_turn(direction, key_delay=self.macro_key_delay)
+            self.history.append(Action(EAction.TURN, direction))
+            self._advance(TURN_CHANGES[direction])
+
+    def _checkpoint(self, previous_pose: tuple) -> bool:
+        """
+        Observe the view in the middle of a macro and check it fits the expected pose:
+        the view changed if the pose did, and the cell ahead matches the explored map.
+        """
+        self.sync()
+        reference = self._last_capture
+        screen = self._capture_view()
+        segments = self._segment_screen(screen)
+        self.macro_stats["observations"] += 1
+        pose = (self.state.coordinates, self.state.direction)
+        if reference is not None and pose != previous_pose:
+            if self.settler is not None:
+                threshold = self.settler.threshold
+            else:
+                threshold = SETTLE_THRESHOLD
+            change = np.abs(
+                view_thumbnail(reference, GAMEVIEW_BOX)
+                - view_thumbnail(screen, GAMEVIEW_BOX)
+            ).mean()
+            if change <= threshold:
+                return False
+        blocked = front_blocked(segments.segments, GAMEVIEW_SIZE)
+        ahead = move_delta(self.state.direction, MoveDirection.FORWARD)
+        known = self.state.map[(pose[0][0] + ahead[0], pose[0][1] + ahead[1])]
+        if (known == BLOCKED and not blocked) or (known == FREE and blocked):
+            return False
+        self.screen = screen
+        self.state.segments = segments
+        self._update_map(*pose, segments)
+        return True
+
+    def read_manual(self, topic: str, topk: int = MANUAL_TOPK) -> dict:
+        """
+        Search the game manual, the result is kept in manual_results.
+        Without a knowledge base the search finds nothing.
+        """
+        if self.knowledge_base is None:
+            print(f"No knowledge base with the game manual, cannot read {topic!r}")
+            result = {
+                "ids": [[]],
+                "documents": [[]],
+                "metadatas": [[]],
+                "distances": [[]],
+            }
+        else:
+            result = self.knowledge_base.query(topic, self.manual_collection, topk)
+        self.manual_results.append({"topic": topic, "result": result})
+        return result
+
+    def _prefetch_manual(self, tools: list):
+        """Query all read_manual topics of an answer together, one batch per topk"""
+        if self.knowledge_base is None:
+            return
+        topics = {}
+        for tool in tools:
+            if tool.name == "read_manual":
+                topk = tool.arguments.get("topk", MANUAL_TOPK)
+                topics.setdefault(topk, []).append(tool.arguments["topic"])
+        for topk, searches in topics.items():
+            self.knowledge_base.query_batch(searches, self.manual_collection, topk)
+
     def new_game(self):
         """Start a new game."""
-        x, y = self._get_ui_button_coordinates(Image.open("ui_elements/new_game.png"))
+        x, y = self._button_coordinates("new_game")
         if x > 0 or y > 0:
             self._mouse_click(x, y)
 
     def move(self, direction: MoveDirection):
         """Move the player in the given direction."""
         self.press_button(direction.value)
-        if direction == MoveDirection.FORWARD:
-            if self.state.direction == GlobalDirection.NORTH:
-                self.change_coordinates((0, 1))
-            elif self.state.direction == GlobalDirection.SOUTH:
-                self.change_coordinates((0, -1))
-            elif self.state.direction == GlobalDirection.EAST:
-                self.change_coordinates((1, 0))
-            elif self.state.direction == GlobalDirection.WEST:
-                self.change_coordinates((-1, 0))
-        elif direction == MoveDirection.BACKWARD:
-            if self.state.direction == GlobalDirection.NORTH:
-                self.change_coordinates((0, -1))
-            elif self.state.direction == GlobalDirection.SOUTH:
-                self.change_coordinates((0, 1))
-            elif self.state.direction == GlobalDirection.EAST:
-                self.change_coordinates((-1, 0))
-            elif self.state.direction == GlobalDirection.WEST:
-                self.change_coordinates((1, 0))
-        if direction == MoveDirection.RIGHT:
-            if self.state.direction == GlobalDirection.NORTH:
-                self.change_coordinates((1, 0))
-            elif self.state.direction == GlobalDirection.SOUTH:
-                self.change_coordinates((-1, 0))
-            elif self.state.direction == GlobalDirection.EAST:
-                self.change_coordinates((0, -1))
-            elif self.state.direction == GlobalDirection.WEST:
-                self.change_coordinates((0, 1))
-        elif direction == MoveDirection.LEFT:
-            if self.state.direction == GlobalDirection.NORTH:
-                self.change_coordinates((-1, 0))
-            elif self.state.direction == GlobalDirection.SOUTH:
-                self.change_coordinates((1, 0))
-            elif self.state.direction == GlobalDirection.EAST:
-                self.change_coordinates((0, 1))
-            elif self.state.direction == GlobalDirection.WEST:
-                self.change_coordinates((0, -1))
+        self._apply_move(direction)
+        self._observe()
+
+    def _apply_move(self, direction: MoveDirection):
+        self.change_coordinates(move_delta(self.state.direction, direction))
         self.history.append(Action(EAction.MOVE, direction))
-        self.next_step()
+        self._advance()
+
+    def goto(self, target: Tuple[int, int], strafe: bool = False) -> list:
+        """
+        Walk to the target coordinates along a path planned over explored free cells,
+        without asking the model on the way. The path is planned again when a wall
+        shows up on it. Returns the executed ("move" | "turn", direction) actions.
+        Raises GotoError for a target that is not an explored free cell or cannot be
+        reached.
+        strafe - step sideways and backward instead of turning first
+        """
+        target = tuple(target)
+        if self.state.map[target] != FREE:
+            raise GotoError(f"{target} is not an explored cell")
+        plan = self.state.map.plan(self.state.coordinates, target, unknown_cost=0)
+        actions = []
+        for _ in range(MAX_GOTO_STEPS):
+            if self.state.coordinates == target:
+                return actions
+            if plan is None:
+                raise GotoError(f"No path to {target} on the explored map")
+            if self.state.map[plan[1]] == BLOCKED:
+                plan = self.state.map.plan(
+                    self.state.coordinates, target, unknown_cost=0
+                )
+                continue
+            for kind, direction in path_actions(plan[:2], self.state.direction, strafe):
+                if kind == "move":
+                    self.move(direction)
+                    actions.append((kind, direction))
+                    plan = plan[1:]
+                    # the next iteration reads the map updated by this step
+                    self.sync()
+                    break
+                self.turn(direction)
+                actions.append((kind, direction))
+                # the view after a turn shows the next cell
+                self.sync()
+                if self.state.map[plan[1]] == BLOCKED:
+                    break
+        raise GotoError(f"{target} not reached in {MAX_GOTO_STEPS} steps")
+
+    def return_to_start(self, strafe: bool = False) -> list:
+        """Walk back to where the game started"""
+        return self.goto((0, 0), strafe=strafe)
 
     def change_coordinates(self, change: Tuple[int, int]):
         new_coordinates = (
@@ -103,35 +417,44 @@ class Player:
 
     def turn(self, direction: TurnDirection):
         """Turn the player in the given direction."""
-        direction_change = 0
         self.history.append(Action(EAction.TURN, direction))
+        self._press_turn(direction)
+        self.next_step(direction_change=TURN_CHANGES[direction])
+
+    def _press_turn(self, direction: TurnDirection, key_delay: float = 0.0):
+        """Press the turn input, key_delay apart for the two presses of AROUND"""
         if direction == TurnDirection.AROUND:
             self.press_button(f"turnright")
+            sleep(key_delay)
             self.press_button(f"turnright")
-            direction_change = 0
         else:
             self.press_button(f"turn{direction.value}")
-            if direction == TurnDirection.LEFT:
-                direction_change = 1
-            else:
-                direction_change = -1
-        self.next_step(direction_change=direction_change)
 
-    def lookaround(self):
-        """Look in four directions and create a single image"""
+    def lookaround(self, fast: bool = False, mosaic: bool = True):
+        """
+        Look in four directions and create a single image
+        fast - reuse the frames captured by the turns and compose them in one buffer
+        mosaic - with fast, return {direction: segments} instead when False
+        """
+        if fast:
+            return self._fast_lookaround(mosaic)
         image_spacing = 5
+        self.sync()
         forward_image = self.get_gameview()
         self.turn(TurnDirection.RIGHT)
-        sleep(VIEW_CHANGE_SLEEP)
+        self._view_sleep()
+        self.sync()
         right_image = self.get_gameview()
         self.turn(TurnDirection.RIGHT)
-        sleep(VIEW_CHANGE_SLEEP)
+        self._view_sleep()
+        self.sync()
         back_image = self.get_gameview()
         self.turn(TurnDirection.RIGHT)
-        sleep(VIEW_CHANGE_SLEEP)
+        self._view_sleep()
+        self.sync()
         left_image = self.get_gameview()
         self.turn(TurnDirection.RIGHT)
-        sleep(VIEW_CHANGE_SLEEP)
+        self._view_sleep()
         aio_image = Image.new(
             "RGBA",
             (
@@ -172,46 +495,100 @@ class Player:
         )
         return aio_image
 
+    def _fast_lookaround(self, mosaic: bool):
+        views = {}
+        segments = {}
+        for idx, name in enumerate(LOOKAROUND_ORDER):
+            if idx > 0:
+                self.turn(TurnDirection.RIGHT)
+            self.sync()
+            segments[name] = self.state.segments
+            if mosaic:
+                views[name] = np.asarray(self.get_gameview())
+        self.turn(TurnDirection.RIGHT)
+        if not mosaic:
+            return segments
+        if self.mosaic is None:
+            view = views[LOOKAROUND_ORDER[0]]
+            self.mosaic = LookaroundMosaic((view.shape[1], view.shape[0]))
+        return self.mosaic.compose(views)
+
     def press_button(self, button: str):
         """Find a button on screen and press it"""
-        x, y = 0, 0
-        if self.ui_buttons_cache.get(button) is None:
-            filename = f"ui_elements/{button}.png"
-            x, y = self._get_ui_button_coordinates(Image.open(filename))
-            if x > 0 and y > 0:
-                self.ui_buttons_cache[button] = (x, y)
-        else:
-            x, y = self.ui_buttons_cache.get(button)
+        x, y = self._button_coordinates(button)
         if x < 0 or y < 0:
             raise Exception(f"Could not find {button} button!")
         self._mouse_click(x, y)
 
+    def _button_coordinates(self, button: str) -> tuple[int, int]:
+        """Return window coordinates of the button's center or (-1, -1)"""
+        position = self.ui_buttons_cache.get(button)
+        if position is None:
+            stored = self.ui_buttons_calibration.get(button)
+            if (
+                stored is not None
+                and self.screen is not None
+                and self.locator.verify(self.screen, button, stored)
+            ):
+                position = stored
+                self.ui_buttons_cache[button] = position
+            else:
+                self._locate_ui_buttons()
+                position = self.ui_buttons_cache.get(button)
+        if position is None:
+            return -1, -1
+        return position[0], position[1] + SCREEN_TOP_OFFSET
+
+    def _locate_ui_buttons(self, region: tuple[int, int, int, int] = None):
+        """Find all UI buttons on a fresh screenshot and save their positions"""
+        self.environment.move_to(
+            self.dosbox_window.topleft.x, self.dosbox_window.topleft.y
+        )
+        found = self.locator.locate_all(self.make_screenshot(), region=region)
+        if len(found) > 0:
+            self.ui_buttons_cache.update(found)
+            self.ui_buttons_calibration.update(found)
+            self.locator.save_calibration(self.ui_geometry, found)
+
     def _get_ui_button_coordinates(self, image: Image) -> tuple[int, int]:
         """Return center of the ui button passed as an image"""
-        pyautogui.moveTo(self.dosbox_window.topleft.x, self.dosbox_window.topleft.y)
+        self.environment.move_to(
+            self.dosbox_window.topleft.x, self.dosbox_window.topleft.y
+        )
         game_image = self.make_screenshot()
-        try:
-            region = pyautogui.locate(
-                needleImage=image, haystackImage=game_image, confidence=0.95
-            )
-            center = pyautogui.center(region)
-            return center.x, center.y + 50
-        except Exception as e:
-            print(f"Could not find image on screen: {e}")
+        position = self.locator.locate(game_image, to_gray(image.convert("RGB")))
+        if position is None:
+            print("Could not find image on screen")
             return -1, -1
+        return position[0], position[1] + SCREEN_TOP_OFFSET
 
     def _mouse_click(self, x, y, left=True, absolute=False):
         """Click the mouse at the given coordinates."""
+        if self.pipeline is not None:
+            # the previous step must be captured before the game changes again
+            self.pipeline.wait_captured()
         _x = self.dosbox_window.topleft.x + x if not absolute else x
         _y = self.dosbox_window.topleft.y + y if not absolute else y
-        pyautogui.click(_x, _y, button="left" if left else "right")
+        self.environment.click(_x, _y, button="left" if left else "right")
 
     def _execute_ai_tool(self, tool: dict):
-        """Execute the given AI tool."""
+        """Execute the given AI tool, a failed goto is kept in tool_errors"""
         if tool.name == "move":
             self.move(MoveDirection(tool.arguments["direction"]))
         elif tool.name == "turn":
             self.turn(TurnDirection(tool.arguments["direction"]))
+        elif tool.name == "goto":
+            try:
+                self.goto((int(tool.arguments["x"]), int(tool.arguments["y"])))
+            except GotoError as e:
+                print(f"goto failed: {e}")
+                self.tool_errors.append(
+                    {"tool": tool.name, "arguments": tool.arguments, "error": str(e)}
+                )
+        elif tool.name == "read_manual":
+            self.read_manual(
+                tool.arguments["topic"], tool.arguments.get("topk", MANUAL_TOPK)
+            )
 
     def _activate_window(self):
         try:
@@ -219,18 +596,95 @@ class Player:
         except:
             pass
         sleep(0.1)
-        pyautogui.click(
+        self.environment.click(
             self.dosbox_window.topleft.x + 1, self.dosbox_window.topleft.y + 1
         )
 
     def next_step(self, direction_change: int = 0):
+        self._advance(direction_change)
+        self._observe()
+
+    def _advance(self, direction_change: int = 0):
+        """Count a step and apply the turn, if any, to the state"""
         self.state.step += 1
         self.state.direction = GlobalDirection(
             (self.state.direction.value + direction_change) % len(GlobalDirection)
         )
-        sleep(VIEW_CHANGE_SLEEP)
-        self.screen = self.make_screenshot()
-        self.segmentview, self.state.segments = self.get_segmentview()
+
+    def _observe(self):
+        """Capture and segment the view of the current step"""
+        self.macro_stats["observations"] += 1
+        if self.pipeline is not None:
+            self.pipeline.submit(
+                self.state.step, (self.state.coordinates, self.state.direction)
+            )
+        else:
+            self.screen = self._capture_view()
+            self.state.segments = self.get_segmentview()
+            self._update_map(
+                self.state.coordinates, self.state.direction, self.state.segments
+            )
+
+    def _update_map(
+        self,
+        coordinates: Tuple[int, int],
+        direction: GlobalDirection,
+        segments: SegmentationResult,
+    ):
+        self.state.map.observe(
+            coordinates,
+            direction,
+            front_blocked(segments.segments, GAMEVIEW_SIZE),
+        )
+
+    def sync(self):
+        """Wait until all submitted steps are observed (pipelined mode only)"""
+        if self.pipeline is not None:
+            self.pipeline.sync()
+
+    def close(self):
+        """
+        Finish the pending steps and stop the pipeline workers, then release the
+        frame source and the logger. Later steps are observed on the calling thread.
+        """
+        pipeline, self.pipeline = self.pipeline, None
+        try:
+            if pipeline is not None:
+                pipeline.close()
+        finally:
+            self.frame_source.close()
+            self.logger.close()
+
+    def __enter__(self) -> "Player":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _capture_view(self) -> Image:
+        """Wait for the view to change after an input and capture it"""
+        if self.settler is not None:
+            # compare with the last capture, self.screen may lag behind when pipelined
+            screen = self.settler.wait(self._last_capture)
+        else:
+            sleep(self.view_change_sleep)
+            screen = self.make_screenshot()
+        self._last_capture = screen
+        return screen
+
+    def _segment_screen(self, screen: Image) -> SegmentationResult:
+        return self.vision.segment_gameview(screen.crop(GAMEVIEW_BOX))
+
+    def _apply_step(self, job: StepJob):
+        """Store results of a pipelined step, called in step order"""
+        self.screen = job.screen
+        self.state.segments = job.result
+        self._update_map(*job.context, job.result)
+
+    def _view_sleep(self):
+        """Extra wait before reading the view again (not needed once the view has settled)"""
+        if self.settler is None:
+            sleep(self.view_change_sleep)
 
     def make_screenshot(self) -> Image:
         # if self.dosbox_window.isActive == False:
@@ -241,15 +695,54 @@ class Player:
             self.dosbox_window.width,
             self.dosbox_window.height - 50,
         )
-        return pyautogui.screenshot(region=aBox)
+        return self.frame_source.grab(aBox)
+
+    def save_state(self, path: str = STATE_FILE) -> str:
+        """Write a binary snapshot of the state and action history, atomically"""
+        self.sync()
+        start = perf_counter()
+        data = dump_snapshot(self.state, self.history)
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+        self.snapshot_ms["save"] = (perf_counter() - start) * 1000
+        return path
+
+    def load_state(self, path: str = STATE_FILE) -> bool:
+        """
+        Restore the state and action history of save_state(), the game has to be at
+        the saved position (its own save game loaded). False when there is no snapshot.
+        """
+        if not os.path.exists(path):
+            return False
+        self.sync()
+        start = perf_counter()
+        with open(path, "rb") as file:
+            self.state, self.history = load_snapshot(file.read(), self.history.depth)
+        self.snapshot_ms["load"] = (perf_counter() - start) * 1000
+        return True
 
     def get_gameview(self) -> Image:
-        return self.screen.crop((7, 67, 455, 338))
+        return self.screen.crop(GAMEVIEW_BOX)
 
-    def get_segmentview(self) -> Image:
+    def get_segmentview(self) -> SegmentationResult:
         image = self.get_gameview()
         return self.vision.segment_gameview(image)
 
+    @property
+    def segmentview(self) -> Image:
+        """
+        Gameview with the segments drawn on it. Segments restored by load_state have no
+        frame, they are drawn on a blank gameview until the next capture.
+        """
+        segments = self.state.segments
+        if segments.image is None:
+            segments.image = np.zeros(
+                (GAMEVIEW_SIZE[1], GAMEVIEW_SIZE[0], 3), dtype=np.uint8
+            )
+        return segments.overlay
+
 
 # def _start_new_game(self):
 # self._mouse_click(505, 155)
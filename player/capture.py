@@ -0,0 +1,131 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Tuple
+from PIL import Image
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+class FrameSource(ABC):
+    """Base class for everything that can provide frames of the game screen"""
+
+    name = "base"
+
+    @abstractmethod
+    def grab(self, region: Tuple[int, int, int, int]) -> Image:
+        """Return a frame of the screen region given as (left, top, width, height)"""
+
+    def close(self):
+        """Release resources held by the source"""
+        pass
+
+
+class PyAutoGuiFrameSource(FrameSource):
+    """Capture frames with pyautogui.screenshot (slow, but works everywhere)"""
+
+    name = "pyautogui"
+
+    def grab(self, region: Tuple[int, int, int, int]) -> Image:
+        import pyautogui
+
+        return pyautogui.screenshot(region=region)
+
+
+class MssFrameSource(FrameSource):
+    """
+    Capture frames with mss, which grabs straight from the X server with XGetImage
+    instead of spawning an external screenshot tool (no MIT-SHM path in mss 9)
+    """
+
+    name = "mss"
+
+    def __init__(self):
+        import mss
+
+        self._mss = mss
+        # mss handles are bound to the thread which created them
+        self._local = threading.local()
+        self._handles = []
+
+    def _handle(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = self._mss.mss()
+            self._local.sct = sct
+            self._handles.append(sct)
+        return sct
+
+    def grab(self, region: Tuple[int, int, int, int]) -> Image:
+        monitor = {
+            "left": region[0],
+            "top": region[1],
+            "width": region[2],
+            "height": region[3],
+        }
+        shot = self._handle().grab(monitor)
+        return Image.frombuffer("RGB", shot.size, shot.bgra, "raw", "BGRX")
+
+    def close(self):
+        for sct in self._handles:
+            sct.close()
+        self._handles.clear()
+        self._local = threading.local()
+
+
+class FileFrameSource(FrameSource):
+    """
+    Feed pre-captured frames from an image file or a directory of images.
+    Frames are returned in file name order as they were recorded, the region is ignored.
+    """
+
+    name = "files"
+
+    def __init__(self, path: str, loop: bool = True, preload: bool = True):
+        if os.path.isdir(path):
+            files = sorted(
+                os.path.join(path, f)
+                for f in os.listdir(path)
+                if f.lower().endswith(IMAGE_EXTENSIONS)
+            )
+        else:
+            files = [path]
+        if len(files) < 1:
+            raise Exception(f"No frames found in {path}")
+        self.files: List[str] = files
+        self.loop = loop
+        self.position = 0
+        self._lock = threading.Lock()
+        self._frames = [self._load(f) for f in files] if preload else None
+
+    @staticmethod
+    def _load(filename: str) -> Image:
+        with Image.open(filename) as image:
+            return image.convert("RGB")
+
+    def grab(self, region: Tuple[int, int, int, int]) -> Image:
+        with self._lock:
+            if self.position >= len(self.files):
+                if not self.loop:
+                    raise Exception("No more frames to feed")
+                self.position = 0
+            idx = self.position
+            self.position += 1
+        if self._frames is not None:
+            return self._frames[idx].copy()
+        return self._load(self.files[idx])
+
+
+def create_frame_source(spec: str = "pyautogui") -> FrameSource:
+    """
+    Create a frame source from a spec string:
+    "pyautogui", "mss" or "files:<path to image or directory>"
+    """
+    name, _, arg = spec.partition(":")
+    if name == PyAutoGuiFrameSource.name:
+        return PyAutoGuiFrameSource()
+    if name == MssFrameSource.name:
+        return MssFrameSource()
+    if name == FileFrameSource.name:
+        return FileFrameSource(arg)
+    raise Exception(f"Unknown frame source: {spec}")
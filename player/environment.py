@@ -0,0 +1,72 @@
+from abc import ABC, abstractmethod
+from typing import List
+from player.capture import FrameSource, PyAutoGuiFrameSource
+
+
+class GameEnvironment(ABC):
+    """
+    Where the game runs: finds its window, sends mouse input and provides frames.
+    Coordinates are absolute screen coordinates.
+    """
+
+    name = "base"
+    # the game runs in real time and needs a while to show the result of an input
+    realtime = True
+
+    @abstractmethod
+    def windows(self, title: str) -> List:
+        """
+        Windows with the title, each with topleft (.x, .y), width, height and
+        activate()
+        """
+
+    @abstractmethod
+    def click(self, x: int, y: int, button: str = "left"):
+        """Click the mouse button ("left" or "right") at the coordinates"""
+
+    @abstractmethod
+    def move_to(self, x: int, y: int):
+        """Move the mouse out of the way without clicking"""
+
+    @abstractmethod
+    def frame_source(self) -> FrameSource:
+        """Frame source capturing this environment"""
+
+
+class PyAutoGuiEnvironment(GameEnvironment):
+    """The game in a real DOSBox-X window, driven with pyautogui"""
+
+    name = "pyautogui"
+
+    def __init__(self):
+        # imported here so headless environments run without a display
+        import pyautogui
+
+        self._pyautogui = pyautogui
+
+    def windows(self, title: str) -> List:
+        return self._pyautogui.getWindowsWithTitle(title)
+
+    def click(self, x: int, y: int, button: str = "left"):
+        self._pyautogui.click(x, y, button=button)
+
+    def move_to(self, x: int, y: int):
+        self._pyautogui.moveTo(x, y)
+
+    def frame_source(self) -> FrameSource:
+        return PyAutoGuiFrameSource()
+
+
+def create_environment(spec: str = "pyautogui") -> GameEnvironment:
+    """
+    Create an environment from a spec string:
+    "pyautogui" or "sim[:<dungeon seed>]" for the headless simulated dungeon
+    """
+    name, _, arg = spec.partition(":")
+    if name == PyAutoGuiEnvironment.name:
+        return PyAutoGuiEnvironment()
+    if name == "sim":
+        from player.simulator import SimulatedEnvironment
+
+        return SimulatedEnvironment(seed=int(arg) if arg else 0)
+    raise Exception(f"Unknown environment: {spec}")
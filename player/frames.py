@@ -0,0 +1,70 @@
+import io
+from collections import OrderedDict
+from threading import Lock
+from time import perf_counter
+from typing import Optional
+from PIL import Image
+
+FRAME_FORMAT = "JPEG"
+FRAME_QUALITY = 80
+# encoded frames kept, a few per step (screen and segment view)
+FRAME_CACHE_SIZE = 8
+
+
+class FrameEncoder:
+    """
+    Encoded (JPEG or WebP) frames of the latest steps for the UI. A frame is encoded
+    once per step and image; reruns of an unchanged step get the same bytes.
+    """
+
+    def __init__(
+        self,
+        image_format: str = FRAME_FORMAT,
+        quality: int = FRAME_QUALITY,
+        size: int = FRAME_CACHE_SIZE,
+    ):
+        self.image_format = image_format.upper()
+        self.quality = quality
+        self.size = size
+        # (name, step) -> (source image, encoded bytes)
+        self._frames = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.encodes = 0
+        self.encode_seconds = 0.0
+
+    def encode(self, name: str, step: int, image: Image) -> Optional[bytes]:
+        """Encoded image of the step, cached while the same image is shown for it"""
+        if image is None:
+            return None
+        key = (name, step)
+        with self._lock:
+            cached = self._frames.get(key)
+            if cached is not None and cached[0] is image:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+        start = perf_counter()
+        buffer = io.BytesIO()
+        image.convert("RGB").save(
+            buffer, format=self.image_format, quality=self.quality
+        )
+        data = buffer.getvalue()
+        with self._lock:
+            self.encodes += 1
+            self.encode_seconds += perf_counter() - start
+            self._frames[key] = (image, data)
+            self._frames.move_to_end(key)
+            while len(self._frames) > self.size:
+                self._frames.popitem(last=False)
+        return data
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "encodes": self.encodes,
+                "encode_ms": round(
+                    self.encode_seconds * 1000 / max(self.encodes, 1), 2
+                ),
+            }
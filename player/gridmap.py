@@ -0,0 +1,215 @@
+import heapq
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from player.types import GlobalDirection, MoveDirection, TurnDirection
+
+UNKNOWN = 0
+FREE = 1
+BLOCKED = 2
+# unexplored cells may be walls, the planner prefers known corridors
+UNKNOWN_COST = 3
+# cells around the explored area and the goal the planner may walk through
+PLAN_MARGIN = 2
+# a segment containing this box of the gameview (fractions of width and height) is
+# taken for a wall right in front of the party
+FRONT_BOX = (0.3, 0.25, 0.7, 0.75)
+
+# (dx, dy) of a step in every GlobalDirection, indexed by its value; north is +y
+HEADINGS = np.array([(0, 1), (-1, 0), (0, -1), (1, 0)], dtype=np.int32)
+HEADING_STEPS = [tuple(delta) for delta in HEADINGS.tolist()]
+HEADING_OF_DELTA = {delta: GlobalDirection(i) for i, delta in enumerate(HEADING_STEPS)}
+# quarter turns to the left from the facing direction to the direction of a move
+MOVE_OFFSETS = {
+    MoveDirection.FORWARD: 0,
+    MoveDirection.LEFT: 1,
+    MoveDirection.BACKWARD: 2,
+    MoveDirection.RIGHT: 3,
+}
+MOVE_OF_OFFSET = {offset: move for move, offset in MOVE_OFFSETS.items()}
+TURN_OF_OFFSET = {
+    1: [TurnDirection.LEFT],
+    2: [TurnDirection.AROUND],
+    3: [TurnDirection.RIGHT],
+}
+
+
+def move_delta(facing: GlobalDirection, move: MoveDirection) -> Tuple[int, int]:
+    """Change of coordinates when moving in the move direction while facing facing"""
+    dx, dy = HEADINGS[(facing.value + MOVE_OFFSETS[move]) % len(HEADINGS)]
+    return int(dx), int(dy)
+
+
+def front_blocked(segments: np.ndarray, view_size: Tuple[int, int]) -> bool:
+    """Heuristic: a single segment covering the middle of the view is a wall ahead"""
+    if len(segments) == 0:
+        return False
+    width, height = view_size
+    left, top = FRONT_BOX[0] * width, FRONT_BOX[1] * height
+    right, bottom = FRONT_BOX[2] * width, FRONT_BOX[3] * height
+    covers = (
+        (segments["x"] <= left)
+        & (segments["y"] <= top)
+        & (segments["x"] + segments["width"] >= right)
+        & (segments["y"] + segments["height"] >= bottom)
+    )
+    return bool(covers.any())
+
+
+class GridMap:
+    """
+    Explored map as an occupancy grid (UNKNOWN, FREE, BLOCKED) over game coordinates.
+    The grid grows in every direction as the party explores; origin is the grid index
+    of coordinates (0, 0).
+    """
+
+    def __init__(self, grid: np.ndarray = None, origin: Tuple[int, int] = (0, 0)):
+        self.grid = grid if grid is not None else np.zeros((1, 1), dtype=np.int8)
+        self.origin = origin
+
+    def __getitem__(self, coordinates: Tuple[int, int]) -> int:
+        row, col = self._index(coordinates)
+        if 0 <= row < self.grid.shape[0] and 0 <= col < self.grid.shape[1]:
+            return int(self.grid[row, col])
+        return UNKNOWN
+
+    def __setitem__(self, coordinates: Tuple[int, int], value: int):
+        self._ensure(coordinates)
+        row, col = self._index(coordinates)
+        self.grid[row, col] = value
+
+    def _index(self, coordinates: Tuple[int, int]) -> Tuple[int, int]:
+        return coordinates[1] + self.origin[1], coordinates[0] + self.origin[0]
+
+    def _ensure(self, coordinates: Tuple[int, int]):
+        """Grow the grid, at least doubling a side, so that coordinates fit"""
+        row, col = self._index(coordinates)
+        rows, cols = self.grid.shape
+        top = max(-row, 0)
+        left = max(-col, 0)
+        bottom = max(row - rows + 1, 0)
+        right = max(col - cols + 1, 0)
+        if top == bottom == left == right == 0:
+            return
+        top, bottom = (max(top, rows) if top else 0), (
+            max(bottom, rows) if bottom else 0
+        )
+        left, right = (max(left, cols) if left else 0), (
+            max(right, cols) if right else 0
+        )
+        self.grid = np.pad(
+            self.grid, ((top, bottom), (left, right)), constant_values=UNKNOWN
+        )
+        self.origin = (self.origin[0] + left, self.origin[1] + top)
+
+    def bounds(self) -> Tuple[int, int, int, int]:
+        """(min x, min y, max x, max y) of the grid in game coordinates"""
+        rows, cols = self.grid.shape
+        return (
+            -self.origin[0],
+            -self.origin[1],
+            cols - 1 - self.origin[0],
+            rows - 1 - self.origin[1],
+        )
+
+    def observe(
+        self,
+        coordinates: Tuple[int, int],
+        facing: GlobalDirection,
+        blocked_ahead: Optional[bool] = None,
+    ):
+        """Update the map from a step: the party cell is free, the cell ahead as seen"""
+        self[coordinates] = FREE
+        if blocked_ahead is None:
+            return
+        dx, dy = HEADINGS[facing.value]
+        ahead = (coordinates[0] + int(dx), coordinates[1] + int(dy))
+        if blocked_ahead:
+            self[ahead] = BLOCKED
+        elif self[ahead] == BLOCKED:
+            # seen open again (a door opened), free once visited
+            self[ahead] = UNKNOWN
+
+    def plan(
+        self,
+        start: Tuple[int, int],
+        goal: Tuple[int, int],
+        unknown_cost: int = UNKNOWN_COST,
+    ) -> Optional[List[Tuple[int, int]]]:
+        """
+        A* over the grid from start to goal, 4-connected, BLOCKED cells are impassable
+        and UNKNOWN ones cost unknown_cost, 0 makes them impassable too. Returns cells
+        from start to goal or None.
+        """
+        if self[goal] == BLOCKED:
+            return None
+        min_x, min_y, max_x, max_y = self.bounds()
+        min_x = min(min_x, start[0], goal[0]) - PLAN_MARGIN
+        min_y = min(min_y, start[1], goal[1]) - PLAN_MARGIN
+        max_x = max(max_x, start[0], goal[0]) + PLAN_MARGIN
+        max_y = max(max_y, start[1], goal[1]) + PLAN_MARGIN
+        # step costs over the search box, looked up instead of branching on cell states
+        costs = np.array([unknown_cost, 1, 0], dtype=np.int32)
+        window = np.full((max_y - min_y + 1, max_x - min_x + 1), UNKNOWN, dtype=np.int8)
+        g_min_x, g_min_y, g_max_x, g_max_y = self.bounds()
+        window[
+            g_min_y - min_y : g_max_y - min_y + 1, g_min_x - min_x : g_max_x - min_x + 1
+        ] = self.grid
+        step_cost = costs[window]
+
+        def heuristic(cell):
+            return abs(cell[0] - goal[0]) + abs(cell[1] - goal[1])
+
+        came_from: Dict[Tuple[int, int], Tuple[int, int]] = {start: None}
+        cost = {start: 0}
+        frontier = [(heuristic(start), 0, start)]
+        while len(frontier) > 0:
+            _, spent, cell = heapq.heappop(frontier)
+            if cell == goal:
+                path = [cell]
+                while came_from[path[-1]] is not None:
+                    path.append(came_from[path[-1]])
+                return path[::-1]
+            if spent > cost[cell]:
+                continue
+            for dx, dy in HEADING_STEPS:
+                nxt = (cell[0] + dx, cell[1] + dy)
+                if not (min_x <= nxt[0] <= max_x and min_y <= nxt[1] <= max_y):
+                    continue
+                step = int(step_cost[nxt[1] - min_y, nxt[0] - min_x])
+                if step == 0:
+                    continue
+                new_cost = spent + step
+                if new_cost < cost.get(nxt, new_cost + 1):
+                    cost[nxt] = new_cost
+                    came_from[nxt] = cell
+                    heapq.heappush(frontier, (new_cost + heuristic(nxt), new_cost, nxt))
+        return None
+
+    def to_dict(self) -> dict:
+        return {"origin": list(self.origin), "rows": self.grid.tolist()}
+
+    @classmethod
+    def from_dict(cls, value: dict) -> "GridMap":
+        return cls(np.array(value["rows"], dtype=np.int8), tuple(value["origin"]))
+
+
+def path_actions(
+    path: List[Tuple[int, int]], facing: GlobalDirection, strafe: bool = False
+) -> List[Tuple[str, object]]:
+    """
+    Compile a path of cells into ("turn", TurnDirection) and ("move", MoveDirection)
+    actions. The party turns to face every step unless strafe is set, then moves
+    sideways or backward without turning.
+    """
+    actions = []
+    for cell, nxt in zip(path, path[1:]):
+        heading = HEADING_OF_DELTA[(nxt[0] - cell[0], nxt[1] - cell[1])]
+        offset = (heading.value - facing.value) % len(HEADINGS)
+        if strafe:
+            actions.append(("move", MOVE_OF_OFFSET[offset]))
+            continue
+        for turn in TURN_OF_OFFSET.get(offset, []):
+            actions.append(("turn", turn))
+        facing = heading
+        actions.append(("move", MoveDirection.FORWARD))
+    return actions
@@ -0,0 +1,90 @@
+import numpy as np
+from typing import Iterator, List
+from player.types import Action, EAction, MoveDirection, TurnDirection
+
+# actions kept by default, older ones are overwritten
+HISTORY_DEPTH = 4096
+# argument of an action stored as its index in the enum of the action kind
+ARG_MEMBERS = {EAction.MOVE: list(MoveDirection), EAction.TURN: list(TurnDirection)}
+ARG_CODES = {
+    kind: {member: i for i, member in enumerate(members)}
+    for kind, members in ARG_MEMBERS.items()
+}
+KINDS = list(EAction)
+
+
+class ActionHistory:
+    """
+    Last depth actions of the party in two uint8 ring buffers (kind and argument).
+    Memory stays flat however long the session runs; total counts every action ever
+    appended.
+    """
+
+    __slots__ = ("kinds", "args", "start", "size", "total")
+
+    def __init__(self, depth: int = HISTORY_DEPTH):
+        if depth < 1:
+            raise ValueError("History depth must be at least 1")
+        self.kinds = np.zeros(depth, dtype=np.uint8)
+        self.args = np.zeros(depth, dtype=np.uint8)
+        self.start = 0
+        self.size = 0
+        self.total = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self.kinds)
+
+    def append(self, action: Action):
+        end = (self.start + self.size) % self.depth
+        self.kinds[end] = action.action.value
+        self.args[end] = ARG_CODES[action.action][action.args]
+        if self.size < self.depth:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % self.depth
+        self.total += 1
+
+    def clear(self):
+        self.start = 0
+        self.size = 0
+        self.total = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _action(self, slot: int) -> Action:
+        kind = KINDS[self.kinds[slot]]
+        return Action(kind, ARG_MEMBERS[kind][self.args[slot]])
+
+    def __getitem__(self, index: int) -> Action:
+        """Action by position, 0 is the oldest kept and -1 the latest"""
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("history index out of range")
+        return self._action((self.start + index) % self.depth)
+
+    def __iter__(self) -> Iterator[Action]:
+        for i in range(self.size):
+            yield self._action((self.start + i) % self.depth)
+
+    def last(self, n: int) -> List[Action]:
+        """Latest n actions, oldest first"""
+        n = min(n, self.size)
+        return [self[i] for i in range(self.size - n, self.size)]
+
+    def ordered(self) -> np.ndarray:
+        """(kind, argument) codes of the kept actions as an (n, 2) array, oldest first"""
+        slots = (self.start + np.arange(self.size)) % self.depth
+        return np.stack((self.kinds[slots], self.args[slots]), axis=1)
+
+    @classmethod
+    def from_codes(cls, codes: np.ndarray, depth: int, total: int) -> "ActionHistory":
+        history = cls(depth)
+        codes = codes[-depth:]
+        history.size = len(codes)
+        history.kinds[: history.size] = codes[:, 0]
+        history.args[: history.size] = codes[:, 1]
+        history.total = max(total, history.size)
+        return history
@@ -0,0 +1,306 @@
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+from threading import Lock
+from time import perf_counter
+from typing import Callable, Iterator, List, Optional
+
+INTENT_CACHE_SIZE = 1024
+# resolved phrases kept from the JSONL file, older ones are dropped when it is compacted
+INTENT_DISK_CACHE_SIZE = 8192
+# bump when the format of cached tools changes, older answers are not reused
+INTENT_CACHE_VERSION = 2
+MAX_REPEAT = 20
+
+NUMBER_WORDS = {
+    "once": 1,
+    "one": 1,
+    "twice": 2,
+    "two": 2,
+    "thrice": 3,
+    "three": 3,
+    "four": 4,
+    "five": 5,
+    "six": 6,
+    "seven": 7,
+    "eight": 8,
+    "nine": 9,
+    "ten": 10,
+}
+MOVE_WORDS = {
+    "forward": "forward",
+    "forwards": "forward",
+    "ahead": "forward",
+    "backward": "backward",
+    "backwards": "backward",
+    "back": "backward",
+    "left": "left",
+    "right": "right",
+}
+TURN_WORDS = {
+    "left": "left",
+    "right": "right",
+    "around": "around",
+    "back": "around",
+}
+MOVE_VERBS = ("move", "go", "walk", "step", "strafe", "run")
+FILLER_WORDS = {"please", "the", "a", "character", "player", "then", "and"}
+CLAUSE_SPLIT = re.compile(r"\s*(?:,|;|\band then\b|\bthen\b|\band\b)\s*")
+GOTO_VERBS = r"(?:go|move|walk|head|navigate|return|get)(?: back)?"
+GOTO_PATTERN = re.compile(rf"^{GOTO_VERBS} to (?P<x>-?\d+) (?P<y>-?\d+)$")
+START_PATTERN = re.compile(
+    rf"^(?:{GOTO_VERBS} to (?:the )?(?:start|starting point|beginning|entrance)|{GOTO_VERBS} home)$"
+)
+COORDINATE_PAIR = re.compile(r"(-?\d+)\s*,\s*(-?\d+)")
+MANUAL_PATTERN = re.compile(
+    r"^(?:read|search|check|look up|lookup)(?: in)?(?: the)? manual(?: about| for| on)? (?P<topic>.+)$"
+)
+
+
+def normalize_phrase(phrase: str) -> str:
+    """Lowercase, drop punctuation (except clause separators) and collapse whitespace"""
+    phrase = phrase.lower().strip()
+    phrase = re.sub(r"[^a-z0-9,;'\s-]", " ", phrase)
+    # keep minus signs of numbers only
+    phrase = re.sub(r"-(?!\d)", " ", phrase)
+    return re.sub(r"\s+", " ", phrase).strip(" ,;")
+
+
+def _tool(name: str, **arguments) -> dict:
+    return {"tool": name, "tool_input": arguments}
+
+
+def _parse_count(words: List[str]) -> Optional[int]:
+    """Pull a repeat count like "3 times", "twice" or "3 steps" out of the words"""
+    count = 1
+    for word in list(words):
+        if word.isdigit():
+            count = int(word)
+        elif word in NUMBER_WORDS:
+            count = NUMBER_WORDS[word]
+        else:
+            continue
+        words.remove(word)
+        for unit in ("times", "time", "steps", "step", "squares", "cells"):
+            if unit in words:
+                words.remove(unit)
+        break
+    if count < 1 or count > MAX_REPEAT:
+        return None
+    return count
+
+
+def _parse_clause(clause: str) -> Optional[List[dict]]:
+    match = MANUAL_PATTERN.match(clause)
+    if match is not None:
+        return [_tool("read_manual", topic=match.group("topic"))]
+    match = GOTO_PATTERN.match(clause)
+    if match is not None:
+        return [_tool("goto", x=int(match.group("x")), y=int(match.group("y")))]
+    if START_PATTERN.match(clause):
+        return [_tool("goto", x=0, y=0)]
+    words = [w for w in clause.split(" ") if w not in FILLER_WORDS]
+    if words in (["look", "around"], ["lookaround"], ["look"]):
+        return [_tool("lookaround")]
+    count = _parse_count(words)
+    if count is None or len(words) == 0:
+        return None
+    if words[0] == "turn" and len(words) == 2 and words[1] in TURN_WORDS:
+        return [_tool("turn", direction=TURN_WORDS[words[1]]) for _ in range(count)]
+    if words[0] in MOVE_VERBS:
+        words = words[1:]
+    if len(words) == 1 and words[0] in MOVE_WORDS:
+        return [_tool("move", direction=MOVE_WORDS[words[0]]) for _ in range(count)]
+    return None
+
+
+def parse_intent(phrase: str) -> Optional[List[dict]]:
+    """
+    Deterministic parser for simple commands like "turn left" or "forward 3 times".
+    Returns tools in the same format as the LLM ({"tool": ..., "tool_input": ...})
+    or None if any part of the phrase is not understood.
+    """
+    normalized = normalize_phrase(phrase)
+    if len(normalized) == 0:
+        return None
+    if MANUAL_PATTERN.match(normalized):
+        # topics may contain "and", don't split them into clauses
+        return _parse_clause(normalized)
+    # "go to 3, 4" is one clause
+    normalized = COORDINATE_PAIR.sub(r"\1 \2", normalized)
+    tools = []
+    for clause in CLAUSE_SPLIT.split(normalized):
+        if len(clause) == 0:
+            continue
+        parsed = _parse_clause(clause)
+        if parsed is None:
+            return None
+        tools.extend(parsed)
+    return tools if len(tools) > 0 else None
+
+
+class IntentCache:
+    """
+    LRU of resolved phrases, optionally backed by an append-only JSONL file.
+    Only the latest max_disk_entries records of the file are kept; the file is
+    rewritten with them once it holds twice as many lines.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = INTENT_CACHE_SIZE,
+        cache_file: str = None,
+        max_disk_entries: int = INTENT_DISK_CACHE_SIZE,
+    ):
+        self.max_entries = max_entries
+        self.cache_file = cache_file
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._disk = OrderedDict()
+        self._disk_lines = 0
+        self._lock = Lock()
+        if self.cache_file is not None and os.path.isfile(self.cache_file):
+            with open(self.cache_file) as file:
+                for line in file:
+                    self._disk_lines += 1
+                    try:
+                        record = json.loads(line)
+                        self._remember_disk(record["key"], record["tools"])
+                    except Exception:
+                        continue
+
+    @staticmethod
+    def key(phrase: str, model: str, prompt: str = "") -> str:
+        """
+        Cache key of a phrase: the model, a hash of its prompt (system message and
+        tools) and the normalized phrase, so answers to another prompt are not reused
+        """
+        digest = hashlib.blake2b(prompt.encode(), digest_size=8).hexdigest()
+        return f"v{INTENT_CACHE_VERSION}\n{model}\n{digest}\n{normalize_phrase(phrase)}"
+
+    def get(self, key: str):
+        """Return (tools, tier) where tier is "memory" or "disk", or (None, None)"""
+        with self._lock:
+            tools = self._entries.get(key)
+            if tools is not None:
+                self._entries.move_to_end(key)
+                return tools, "memory"
+            tools = self._disk.get(key)
+        if tools is not None:
+            self._remember(key, tools)
+            return tools, "disk"
+        return None, None
+
+    def put(self, key: str, tools: List[dict]):
+        self._remember(key, tools)
+        if self.cache_file is None:
+            return
+        with self._lock:
+            if key in self._disk:
+                return
+            self._remember_disk(key, tools)
+            if self._disk_lines >= 2 * self.max_disk_entries:
+                self._compact()
+                return
+            with open(self.cache_file, "a") as file:
+                file.write(json.dumps({"key": key, "tools": tools}) + "\n")
+            self._disk_lines += 1
+
+    def _remember_disk(self, key: str, tools: List[dict]):
+        self._disk[key] = tools
+        self._disk.move_to_end(key)
+        while len(self._disk) > self.max_disk_entries:
+            self._disk.popitem(last=False)
+
+    def _compact(self):
+        """Rewrite the file with the kept records only, lock held"""
+        tmp_file = f"{self.cache_file}.tmp"
+        with open(tmp_file, "w") as file:
+            for key, tools in self._disk.items():
+                file.write(json.dumps({"key": key, "tools": tools}) + "\n")
+        os.replace(tmp_file, self.cache_file)
+        self._disk_lines = len(self._disk)
+
+    def _remember(self, key: str, tools: List[dict]):
+        with self._lock:
+            self._entries[key] = tools
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class IntentResolver:
+    """
+    Resolve a phrase to tools: deterministic grammar first, then the cache,
+    and only then the LLM. Keeps per-tier counters and latency.
+    """
+
+    TIERS = ("grammar", "memory", "disk", "llm")
+
+    def __init__(self, model: str, cache: IntentCache = None, prompt: str = ""):
+        """prompt - everything the LLM answer depends on besides the phrase"""
+        self.model = model
+        self.prompt = prompt
+        self.cache = cache if cache is not None else IntentCache()
+        self.counts = {tier: 0 for tier in self.TIERS}
+        self.seconds = {tier: 0.0 for tier in self.TIERS}
+
+    def resolve(self, phrase: str, llm: Callable[[str], List[dict]]) -> List[dict]:
+        start = perf_counter()
+        tools = parse_intent(phrase)
+        tier = "grammar"
+        if tools is None:
+            key = IntentCache.key(phrase, self.model, self.prompt)
+            tools, tier = self.cache.get(key)
+            if tools is None:
+                tier = "llm"
+                tools = llm(phrase)
+                if len(tools) > 0:
+                    self.cache.put(key, tools)
+        self.counts[tier] += 1
+        self.seconds[tier] += perf_counter() - start
+        return tools
+
+    def resolve_stream(
+        self, phrase: str, llm: Callable[[str], Iterator[dict]]
+    ) -> Iterator[dict]:
+        """Like resolve, but tools from the LLM are passed on as soon as they arrive"""
+        start = perf_counter()
+        tools = parse_intent(phrase)
+        tier = "grammar"
+        if tools is None:
+            key = IntentCache.key(phrase, self.model, self.prompt)
+            tools, tier = self.cache.get(key)
+        if tools is not None:
+            self.counts[tier] += 1
+            self.seconds[tier] += perf_counter() - start
+            yield from tools
+            return
+        tools = []
+        for t in llm(phrase):
+            tools.append(t)
+            yield t
+        self.counts["llm"] += 1
+        self.seconds["llm"] += perf_counter() - start
+        if len(tools) > 0:
+            self.cache.put(key, tools)
+
+    def stats(self) -> dict:
+        """Phrases resolved per tier and the LLM time saved by the local tiers"""
+        llm_calls = self.counts["llm"]
+        llm_latency = self.seconds["llm"] / llm_calls if llm_calls > 0 else 0.0
+        local = [t for t in self.TIERS if t != "llm"]
+        saved = sum(self.counts[t] for t in local) * llm_latency - sum(
+            self.seconds[t] for t in local
+        )
+        return {
+            "resolved": dict(self.counts),
+            "mean_ms": {
+                t: self.seconds[t] / self.counts[t] * 1000
+                for t in self.TIERS
+                if self.counts[t] > 0
+            },
+            "saved_seconds": max(saved, 0.0),
+        }
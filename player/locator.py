@@ -0,0 +1,127 @@
+import json
+import os
+from typing import Dict, Iterable, Optional, Tuple
+from PIL import Image
+import cv2
+import numpy as np
+
+UI_ELEMENTS_DIR = "ui_elements"
+CALIBRATION_FILE = "ui_calibration.json"
+MATCH_CONFIDENCE = 0.95
+
+
+def to_gray(image) -> np.ndarray:
+    """Grayscale numpy array from a PIL image or an RGB(A) array"""
+    arr = np.asarray(image)
+    if arr.ndim == 2:
+        return arr
+    if arr.shape[2] == 4:
+        return cv2.cvtColor(arr, cv2.COLOR_RGBA2GRAY)
+    return cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY)
+
+
+class ButtonLocator:
+    """
+    Find UI buttons on the screen. All templates from elements_dir are loaded once and
+    matched against a single screenshot; found positions are saved per window geometry.
+    Positions are centers of the buttons in screenshot coordinates.
+    """
+
+    def __init__(
+        self,
+        elements_dir: str = UI_ELEMENTS_DIR,
+        calibration_file: str = CALIBRATION_FILE,
+        confidence: float = MATCH_CONFIDENCE,
+    ):
+        self.confidence = confidence
+        self.calibration_file = calibration_file
+        self.templates: Dict[str, np.ndarray] = {}
+        for filename in sorted(os.listdir(elements_dir)):
+            name, ext = os.path.splitext(filename)
+            if ext.lower() != ".png":
+                continue
+            with Image.open(os.path.join(elements_dir, filename)) as image:
+                self.templates[name] = to_gray(image.convert("RGB"))
+
+    @staticmethod
+    def geometry_key(width: int, height: int) -> str:
+        return f"{width}x{height}"
+
+    def locate(
+        self,
+        screen,
+        template: np.ndarray,
+        region: Tuple[int, int, int, int] = None,
+    ) -> Optional[Tuple[int, int]]:
+        """
+        Center of the best match of a grayscale template on the screen, or None.
+        region (left, top, right, bottom) limits the search area.
+        """
+        gray = to_gray(screen)
+        left, top = 0, 0
+        if region is not None:
+            left, top = region[0], region[1]
+            gray = gray[region[1] : region[3], region[0] : region[2]]
+        th, tw = template.shape
+        if gray.shape[0] < th or gray.shape[1] < tw:
+            return None
+        scores = cv2.matchTemplate(gray, template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, (x, y) = cv2.minMaxLoc(scores)
+        if best < self.confidence:
+            return None
+        return left + x + tw // 2, top + y + th // 2
+
+    def locate_all(
+        self,
+        screen,
+        names: Iterable[str] = None,
+        region: Tuple[int, int, int, int] = None,
+    ) -> Dict[str, Tuple[int, int]]:
+        """Find all (or the named) buttons on one screenshot"""
+        gray = to_gray(screen)
+        found = {}
+        for name in names if names is not None else self.templates.keys():
+            position = self.locate(gray, self.templates[name], region)
+            if position is not None:
+                found[name] = position
+        return found
+
+    def verify(self, screen, name: str, position: Tuple[int, int]) -> bool:
+        """Check that the button is still at the given position"""
+        template = self.templates.get(name)
+        if template is None:
+            return False
+        th, tw = template.shape
+        x, y = position[0] - tw // 2, position[1] - th // 2
+        patch = to_gray(screen)[y : y + th, x : x + tw]
+        if x < 0 or y < 0 or patch.shape != template.shape:
+            return False
+        score = cv2.matchTemplate(patch, template, cv2.TM_CCOEFF_NORMED)[0, 0]
+        return bool(score >= self.confidence)
+
+    def load_calibration(self, geometry: str) -> Dict[str, Tuple[int, int]]:
+        """Button positions saved for the window geometry"""
+        calibration = self._read_calibration()
+        return {k: tuple(v) for k, v in calibration.get(geometry, {}).items()}
+
+    def save_calibration(self, geometry: str, positions: Dict[str, Tuple[int, int]]):
+        if self.calibration_file is None:
+            return
+        calibration = self._read_calibration()
+        calibration.setdefault(geometry, {}).update(
+            {k: list(v) for k, v in positions.items()}
+        )
+        tmp_file = f"{self.calibration_file}.tmp"
+        with open(tmp_file, "w") as file:
+            json.dump(calibration, file, indent=2)
+        os.replace(tmp_file, self.calibration_file)
+
+    def _read_calibration(self) -> dict:
+        if self.calibration_file is None or not os.path.isfile(self.calibration_file):
+            return {}
+        try:
+            with open(self.calibration_file) as file:
+                return json.load(file)
+        except Exception as e:
+            print(f"Could not read UI calibration: {e}")
+            return {}
@@ -0,0 +1,62 @@
+from typing import Dict, Tuple
+from PIL import Image, ImageDraw, ImageFont
+import cv2
+import numpy as np
+
+LABEL_FONT = "arialbd.ttf"
+LABEL_FONT_SIZE = 24
+LABEL_COLOR = (255, 255, 0)  # yellow
+LABEL_OFFSET = (10, 10)
+# position of every direction in the 2x2 mosaic and its label
+LOOKAROUND_LAYOUT = {
+    "forward": ((0, 0), "Forward"),
+    "right": ((1, 0), "Right"),
+    "left": ((0, 1), "Left"),
+    "back": ((1, 1), "Back"),
+}
+
+
+class LookaroundMosaic:
+    """
+    Build the 2x2 lookaround image by copying views into one preallocated RGBA buffer.
+    The font is loaded and the labels are rasterized once.
+    """
+
+    def __init__(self, view_size: Tuple[int, int], spacing: int = 5):
+        width, height = view_size
+        self.view_size = view_size
+        self.buffer = np.zeros(
+            (height * 2 + spacing, width * 2 + spacing, 4), dtype=np.uint8
+        )
+        self.origins = {
+            name: (col * (width + spacing), row * (height + spacing))
+            for name, ((col, row), _) in LOOKAROUND_LAYOUT.items()
+        }
+        font = ImageFont.truetype(LABEL_FONT, LABEL_FONT_SIZE)
+        # label coverage masks cropped to their bounding boxes: (x, y, mask)
+        self.labels = {}
+        for name, (_, text) in LOOKAROUND_LAYOUT.items():
+            layer = Image.new("L", view_size)
+            ImageDraw.Draw(layer).text(LABEL_OFFSET, text, fill=255, font=font)
+            box = layer.getbbox()
+            if box is None:
+                continue
+            mask = np.asarray(layer.crop(box), dtype=np.uint32)[:, :, None]
+            self.labels[name] = (box[0], box[1], mask)
+        self._ink = np.array(LABEL_COLOR, dtype=np.uint32)
+
+    def compose(self, views: Dict[str, np.ndarray]) -> Image:
+        """Mosaic of RGB views keyed by direction name"""
+        width, height = self.view_size
+        for name, view in views.items():
+            x, y = self.origins[name]
+            tile = self.buffer[y : y + height, x : x + width]
+            cv2.cvtColor(view[:, :, :3], cv2.COLOR_RGB2RGBA, dst=tile)
+            label = self.labels.get(name)
+            if label is not None:
+                lx, ly, mask = label
+                region = tile[ly : ly + mask.shape[0], lx : lx + mask.shape[1], :3]
+                # same rounding as PIL's mask blending
+                blend = region * (255 - mask) + self._ink * mask + 128
+                region[:] = ((blend >> 8) + blend) >> 8
+        return Image.fromarray(self.buffer.copy(), "RGBA")
@@ -0,0 +1,135 @@
+import queue
+from threading import Event, Thread
+from time import perf_counter
+from typing import Callable
+from PIL import Image
+
+
+class StepJob:
+    """Observation of a single step travelling through the pipeline"""
+
+    __slots__ = ("step", "context", "captured", "done", "screen", "result", "error")
+
+    def __init__(self, step: int, context=None):
+        self.step = step
+        self.context = context  # caller data handed back to apply
+        self.captured = Event()
+        self.done = Event()
+        self.screen = None
+        self.result = None
+        self.error = None
+
+
+class StepPipeline:
+    """
+    Run step observations (wait for the view, capture, segment) on worker threads:
+    one captures frames, the other processes them. Each stage handles jobs strictly
+    in submit order, so apply() is called in step order. The next input only has to
+    wait until the previous frame was captured, processing overlaps with it.
+    """
+
+    def __init__(
+        self,
+        capture: Callable[[], Image],
+        process: Callable[[Image], object],
+        apply: Callable[[StepJob], None],
+        max_pending: int = 8,
+    ):
+        self.capture = capture
+        self.process = process
+        self.apply = apply
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._processing = queue.Queue()
+        self._last = None
+        self._error = None
+        self._started = None
+        self.completed = 0
+        self._threads = [
+            Thread(target=self._capture_worker, name="step-capture", daemon=True),
+            Thread(target=self._process_worker, name="step-process", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, step: int, context=None) -> StepJob:
+        """Queue observation of the step, context is passed to apply with the job"""
+        job = StepJob(step, context)
+        if self._started is None:
+            self._started = perf_counter()
+        self._queue.put(job)
+        self._last = job
+        return job
+
+    def wait_captured(self):
+        """Block until the last submitted step has its frame captured"""
+        job = self._last
+        if job is not None:
+            job.captured.wait()
+        self._raise()
+
+    def sync(self):
+        """Block until every submitted step has been applied"""
+        job = self._last
+        if job is not None:
+            job.done.wait()
+        self._raise()
+
+    def close(self):
+        """Finish the submitted steps and stop the workers, even if a step failed"""
+        try:
+            self.sync()
+        finally:
+            self._queue.put(None)
+            for thread in self._threads:
+                thread.join()
+
+    def stats(self) -> dict:
+        elapsed = perf_counter() - self._started if self._started is not None else 0
+        return {
+            "completed": self.completed,
+            "pending": self._queue.qsize() + self._processing.qsize(),
+            "steps_per_second": self.completed / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def _raise(self):
+        """Re-raise the first error from the worker in the calling thread"""
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _fail(self, job: StepJob, error: Exception):
+        job.error = error
+        if self._error is None:
+            self._error = error
+        job.captured.set()
+        job.done.set()
+
+    def _capture_worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._processing.put(None)
+                break
+            try:
+                job.screen = self.capture()
+            except Exception as e:
+                self._fail(job, e)
+                continue
+            job.captured.set()
+            self._processing.put(job)
+
+    def _process_worker(self):
+        while True:
+            job = self._processing.get()
+            if job is None:
+                break
+            try:
+                job.result = self.process(job.screen)
+                self.apply(job)
+                self.completed += 1
+            except Exception as e:
+                job.error = e
+                if self._error is None:
+                    self._error = e
+            finally:
+                job.done.set()
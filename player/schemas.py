@@ -38,6 +38,30 @@ def turn_schema() -> str:
     }
 
 
+def goto_schema() -> str:
+    return {
+        "type": "function",
+        "function": {
+            "name": "goto",
+            "description": "Walk the character to a known location on the explored map. The game starts at x=0, y=0; north is +y, east is +x",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "x": {
+                        "type": "integer",
+                        "description": "Target x coordinate",
+                    },
+                    "y": {
+                        "type": "integer",
+                        "description": "Target y coordinate",
+                    },
+                },
+                "required": ["x", "y"],
+            },
+        },
+    }
+
+
 def lookaround_schema() -> str:
     return {
         "type": "function",
@@ -0,0 +1,164 @@
+import hashlib
+import os
+from collections import OrderedDict
+from threading import Lock
+import numpy as np
+
+SEGMENT_CACHE_SIZE = 256
+# the disk tier drops its least recently used files above this size
+SEGMENT_DISK_CACHE_BYTES = 16 * 1024 * 1024
+DISK_EXTENSION = ".npy"
+
+
+class SegmentationCache:
+    """
+    Bounded LRU cache of segment arrays keyed by a hash of the gameview pixels.
+    The key already identifies the frame, so frames are not stored.
+    If disk_dir is given, arrays are also saved there (at most disk_max_bytes)
+    so they survive restarts.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = SEGMENT_CACHE_SIZE,
+        disk_dir: str = None,
+        disk_max_bytes: int = SEGMENT_DISK_CACHE_BYTES,
+    ):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        # disk entries, least recently used first: key -> size in bytes
+        self._disk_entries = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        if self.disk_dir is not None:
+            if not os.path.isdir(self.disk_dir):
+                os.makedirs(self.disk_dir)
+            self._scan_disk()
+
+    @staticmethod
+    def key(image: np.ndarray) -> str:
+        """Content hash of the image array"""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(str(image.shape).encode())
+        h.update(np.ascontiguousarray(image).data)
+        return h.hexdigest()
+
+    def get(self, key: str):
+        """Return the cached array for the key or None"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+        value = self._disk_get(key)
+        if value is not None:
+            with self._lock:
+                self.disk_hits += 1
+            self._remember(key, value)
+            return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: np.ndarray):
+        """Store the array in memory and on disk"""
+        self._remember(key, value)
+        self._disk_put(key, value)
+
+    def _remember(self, key: str, value: np.ndarray):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}{DISK_EXTENSION}")
+
+    def _scan_disk(self):
+        """Index the files of previous runs, oldest first"""
+        files = []
+        for filename in os.listdir(self.disk_dir):
+            if not filename.endswith(DISK_EXTENSION):
+                continue
+            path = os.path.join(self.disk_dir, filename)
+            stat = os.stat(path)
+            files.append(
+                (stat.st_mtime, filename[: -len(DISK_EXTENSION)], stat.st_size)
+            )
+        for _, key, size in sorted(files):
+            self._disk_entries[key] = size
+            self._disk_bytes += size
+        self._disk_evict()
+
+    def _disk_evict(self):
+        """Delete least recently used files over the size limit, lock held"""
+        while self._disk_bytes > self.disk_max_bytes and len(self._disk_entries) > 0:
+            key, size = self._disk_entries.popitem(last=False)
+            self._disk_bytes -= size
+            self.disk_evictions += 1
+            try:
+                os.remove(self._disk_path(key))
+            except FileNotFoundError:
+                pass
+
+    def _disk_get(self, key: str):
+        if self.disk_dir is None:
+            return None
+        with self._lock:
+            if key not in self._disk_entries:
+                return None
+            self._disk_entries.move_to_end(key)
+        path = self._disk_path(key)
+        try:
+            value = np.load(path, allow_pickle=False)
+            os.utime(path)
+            return value
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Broken segmentation cache entry {key}: {e}")
+            return None
+
+    def _disk_put(self, key: str, value: np.ndarray):
+        if self.disk_dir is None:
+            return
+        with self._lock:
+            if key in self._disk_entries:
+                return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            np.save(file, value, allow_pickle=False)
+        os.replace(tmp_path, path)
+        with self._lock:
+            size = os.path.getsize(path)
+            self._disk_entries[key] = size
+            self._disk_bytes += size
+            self._disk_evict()
+
+    def clear(self):
+        """Drop in-memory entries (the disk tier is kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_bytes": self._disk_bytes,
+                "disk_evictions": self.disk_evictions,
+            }
@@ -0,0 +1,94 @@
+from collections import deque
+from time import perf_counter, sleep
+from typing import Callable, Tuple
+from PIL import Image
+import cv2
+import numpy as np
+
+SETTLE_TIMEOUT = 1.0
+SETTLE_POLL_INTERVAL = 0.02
+# How long to wait for the view to change at all before accepting an unchanged view
+# (e.g. when walking into a wall)
+SETTLE_NO_CHANGE_WAIT = 0.1
+# Mean absolute difference of downscaled grayscale frames considered "the same"
+SETTLE_THRESHOLD = 2.0
+THUMBNAIL_SIZE = (64, 40)
+
+
+def view_thumbnail(image: Image, box: Tuple[int, int, int, int]) -> np.ndarray:
+    """Downscaled grayscale copy of the box (left, top, right, bottom) of the image"""
+    arr = np.asarray(image)[box[1] : box[3], box[0] : box[2]]
+    gray = cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY)
+    return cv2.resize(gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(
+        np.int16
+    )
+
+
+class ViewSettler:
+    """Wait until the game view stops changing instead of sleeping for a fixed time"""
+
+    def __init__(
+        self,
+        grab: Callable[[], Image],
+        box: Tuple[int, int, int, int],
+        timeout: float = SETTLE_TIMEOUT,
+        poll_interval: float = SETTLE_POLL_INTERVAL,
+        threshold: float = SETTLE_THRESHOLD,
+        no_change_wait: float = SETTLE_NO_CHANGE_WAIT,
+    ):
+        self.grab = grab
+        self.box = box
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.threshold = threshold
+        self.no_change_wait = no_change_wait
+        self.durations = deque(maxlen=1000)
+        self.last_duration = 0.0
+        self.timeouts = 0
+
+    def same(self, a: np.ndarray, b: np.ndarray) -> bool:
+        return float(np.abs(a - b).mean()) <= self.threshold
+
+    def wait(self, reference: Image = None) -> Image:
+        """
+        Poll frames until two consecutive ones match and return the last one.
+        reference is the frame from before the input; while the view still matches it
+        we keep waiting for up to no_change_wait for the game to react.
+        """
+        start = perf_counter()
+        reference_thumb = (
+            view_thumbnail(reference, self.box) if reference is not None else None
+        )
+        previous = None
+        while True:
+            screen = self.grab()
+            thumb = view_thumbnail(screen, self.box)
+            elapsed = perf_counter() - start
+            if previous is not None and self.same(previous, thumb):
+                if (
+                    reference_thumb is None
+                    or not self.same(reference_thumb, thumb)
+                    or elapsed >= self.no_change_wait
+                ):
+                    break
+            if elapsed >= self.timeout:
+                self.timeouts += 1
+                break
+            previous = thumb
+            sleep(self.poll_interval)
+        self.last_duration = perf_counter() - start
+        self.durations.append(self.last_duration)
+        return screen
+
+    def stats(self) -> dict:
+        """Summary of the recent settle times"""
+        if len(self.durations) == 0:
+            return {"count": 0, "timeouts": self.timeouts}
+        arr = np.asarray(self.durations)
+        return {
+            "count": int(arr.size),
+            "timeouts": self.timeouts,
+            "last_ms": self.last_duration * 1000,
+            "mean_ms": float(arr.mean() * 1000),
+            "max_ms": float(arr.max() * 1000),
+        }
@@ -0,0 +1,304 @@
+import os
+from threading import Lock
+from time import perf_counter
+from typing import Dict, List, NamedTuple, Tuple
+import numpy as np
+from PIL import Image, ImageDraw
+from player import GAMEVIEW_BOX, GAMEVIEW_SIZE, SCREEN_TOP_OFFSET
+from player.capture import FrameSource
+from player.environment import GameEnvironment
+from player.gridmap import HEADINGS, move_delta
+from player.locator import UI_ELEMENTS_DIR
+from player.types import GlobalDirection, MoveDirection
+
+WINDOW_TITLE = "DOSBox-X"
+WINDOW_SIZE = (660, 460)
+# cells of the dungeon, odd so the maze has walls all around
+DUNGEON_SIZE = (15, 15)
+# share of maze walls knocked down to make loops
+LOOP_SHARE = 0.1
+# cells ahead drawn in the gameview
+VIEW_DEPTH = 3
+# half width and half height of the wall frames at distance 0..VIEW_DEPTH + 1, as
+# fractions of the gameview; a wall right ahead covers player.gridmap.FRONT_BOX,
+# farther ones do not
+FRAME_HALF_WIDTHS = (0.5, 0.32, 0.16, 0.09, 0.05)
+FRAME_HALF_HEIGHTS = (0.5, 0.34, 0.18, 0.1, 0.06)
+# walls facing the party are dark and segmented, side walls light like the floor so
+# they never merge with them
+BACKGROUND_COLOR = (0, 0, 0)
+CEILING_COLOR = (176, 176, 184)
+FLOOR_COLOR = (150, 140, 120)
+SIDE_WALL_COLOR = (200, 200, 200)
+FRONT_WALL_COLOR = (70, 70, 80)
+FAR_COLOR = (0, 0, 0)
+EDGE_COLOR = (40, 40, 40)
+# top left corners of the buttons of ui_elements in screenshot coordinates
+BUTTON_LAYOUT = {
+    "turnleft": (476, 260),
+    "forward": (530, 260),
+    "turnright": (584, 260),
+    "left": (476, 304),
+    "backward": (530, 304),
+    "right": (584, 304),
+    "new_game": (612, 12),
+}
+TURN_OFFSETS = {"turnleft": 1, "turnright": -1}
+
+
+def generate_dungeon(size: Tuple[int, int] = DUNGEON_SIZE, seed: int = 0) -> np.ndarray:
+    """
+    Deterministic maze with some loops as a bool wall grid indexed [y, x], north is +y.
+    Cells with both coordinates odd are open.
+    """
+    width, height = size
+    rng = np.random.default_rng(seed)
+    walls = np.ones((height, width), dtype=bool)
+    start = (1, 1)
+    walls[start[1], start[0]] = False
+    stack = [start]
+    while len(stack) > 0:
+        x, y = stack[-1]
+        options = [
+            (x + 2 * int(dx), y + 2 * int(dy))
+            for dx, dy in HEADINGS
+            if 0 < x + 2 * dx < width - 1
+            and 0 < y + 2 * dy < height - 1
+            and walls[y + 2 * dy, x + 2 * dx]
+        ]
+        if len(options) == 0:
+            stack.pop()
+            continue
+        nx, ny = options[rng.integers(len(options))]
+        walls[(y + ny) // 2, (x + nx) // 2] = False
+        walls[ny, nx] = False
+        stack.append((nx, ny))
+    # inner walls between two open cells, knocking some down adds loops
+    inner = [
+        (x, y)
+        for y in range(1, height - 1)
+        for x in range(1, width - 1)
+        if walls[y, x]
+        and (
+            (not walls[y, x - 1] and not walls[y, x + 1])
+            or (not walls[y - 1, x] and not walls[y + 1, x])
+        )
+    ]
+    for i in rng.permutation(len(inner))[: int(len(inner) * LOOP_SHARE)]:
+        x, y = inner[i]
+        walls[y, x] = False
+    return walls
+
+
+class Point(NamedTuple):
+    x: int
+    y: int
+
+
+class SimulatedWindow:
+    """Stand-in for a pyautogui window"""
+
+    def __init__(self, title: str, left: int, top: int, width: int, height: int):
+        self.title = title
+        self.topleft = Point(left, top)
+        self.width = width
+        self.height = height
+
+    def activate(self):
+        pass
+
+
+class SimulatedDungeon:
+    """Party in a grid dungeon moved by button names, as the game reacts to clicks"""
+
+    def __init__(self, walls: np.ndarray, start: Tuple[int, int] = (1, 1)):
+        self.walls = walls
+        self.start = start
+        self.reset()
+
+    def reset(self):
+        self.position = self.start
+        self.facing = GlobalDirection.NORTH
+        self.steps = 0
+        self.bumps = 0
+
+    def is_wall(self, cell: Tuple[int, int]) -> bool:
+        x, y = cell
+        height, width = self.walls.shape
+        if not (0 <= x < width and 0 <= y < height):
+            return True
+        return bool(self.walls[y, x])
+
+    def press(self, button: str):
+        if button == "new_game":
+            self.reset()
+            return
+        self.steps += 1
+        if button in TURN_OFFSETS:
+            self.facing = GlobalDirection(
+                (self.facing.value + TURN_OFFSETS[button]) % len(GlobalDirection)
+            )
+            return
+        dx, dy = move_delta(self.facing, MoveDirection(button))
+        target = (self.position[0] + dx, self.position[1] + dy)
+        if self.is_wall(target):
+            self.bumps += 1
+        else:
+            self.position = target
+
+    def cell(self, ahead: int, side: int) -> Tuple[int, int]:
+        """Cell ahead cells in front and side cells to the left of the party"""
+        fx, fy = move_delta(self.facing, MoveDirection.FORWARD)
+        lx, ly = move_delta(self.facing, MoveDirection.LEFT)
+        return (
+            self.position[0] + ahead * fx + side * lx,
+            self.position[1] + ahead * fy + side * ly,
+        )
+
+    def render_view(self, size: Tuple[int, int] = GAMEVIEW_SIZE) -> Image:
+        """First person view: side walls of the corridor and the first wall ahead"""
+        width, height = size
+        cx, cy = width / 2, height / 2
+        frames = [
+            (cx - hw * width, cy - hh * height, cx + hw * width, cy + hh * height)
+            for hw, hh in zip(FRAME_HALF_WIDTHS, FRAME_HALF_HEIGHTS)
+        ]
+        image = Image.new("RGB", size, CEILING_COLOR)
+        draw = ImageDraw.Draw(image)
+        draw.rectangle((0, cy, width, height), fill=FLOOR_COLOR)
+        depth = VIEW_DEPTH + 1
+        for ahead in range(1, VIEW_DEPTH + 1):
+            if self.is_wall(self.cell(ahead, 0)):
+                depth = ahead
+                break
+        for ahead in range(depth):
+            near, far = frames[ahead], frames[ahead + 1]
+            for side, near_x, far_x in ((1, near[0], far[0]), (-1, near[2], far[2])):
+                if self.is_wall(self.cell(ahead, side)):
+                    polygon = [
+                        (near_x, near[1]),
+                        (far_x, far[1]),
+                        (far_x, far[3]),
+                        (near_x, near[3]),
+                    ]
+                else:
+                    # face of the wall across the side opening
+                    polygon = [
+                        (near_x, far[1]),
+                        (far_x, far[1]),
+                        (far_x, far[3]),
+                        (near_x, far[3]),
+                    ]
+                    if not self.is_wall(self.cell(ahead + 1, side)):
+                        continue
+                draw.polygon(polygon, fill=SIDE_WALL_COLOR, outline=EDGE_COLOR)
+        face = frames[depth]
+        draw.rectangle(
+            face,
+            fill=FRONT_WALL_COLOR if depth <= VIEW_DEPTH else FAR_COLOR,
+            outline=EDGE_COLOR,
+        )
+        return image
+
+
+class SimulatedEnvironment(GameEnvironment):
+    """
+    Headless stand-in for Dungeon Master in DOSBox-X: a deterministic maze drawn into a
+    window laid out like the real one, with the ui_elements buttons that react to clicks.
+    Inputs take effect at once, so Player runs at full speed without a display.
+    """
+
+    name = "sim"
+    realtime = False
+
+    def __init__(
+        self,
+        seed: int = 0,
+        dungeon_size: Tuple[int, int] = DUNGEON_SIZE,
+        window_origin: Tuple[int, int] = (0, 0),
+        elements_dir: str = UI_ELEMENTS_DIR,
+        min_key_interval: float = 0.0,
+    ):
+        """
+        min_key_interval - button presses closer than this to the previous one are
+        lost, like inputs the real game gets between two of its ticks
+        """
+        self.min_key_interval = min_key_interval
+        self._last_press = None
+        self.dungeon = SimulatedDungeon(generate_dungeon(dungeon_size, seed))
+        self.window = SimulatedWindow(WINDOW_TITLE, *window_origin, *WINDOW_SIZE)
+        self.buttons: Dict[str, Tuple[Image.Image, Tuple[int, int, int, int]]] = {}
+        for name, (left, top) in BUTTON_LAYOUT.items():
+            with Image.open(os.path.join(elements_dir, f"{name}.png")) as image:
+                button = image.convert("RGB")
+            self.buttons[name] = (
+                button,
+                (left, top, left + button.width, top + button.height),
+            )
+        self._lock = Lock()
+        # window images by party pose, the dungeon does not change
+        self._screens: Dict[tuple, Image.Image] = {}
+        self.clicks = 0
+        self.dropped = 0
+        self.frames = 0
+
+    def windows(self, title: str) -> List:
+        return [self.window] if title in self.window.title else []
+
+    def click(self, x: int, y: int, button: str = "left"):
+        """Press the button under the click, clicks elsewhere are ignored"""
+        x -= self.window.topleft.x
+        y -= self.window.topleft.y + SCREEN_TOP_OFFSET
+        with self._lock:
+            self.clicks += 1
+            for name, (_, (left, top, right, bottom)) in self.buttons.items():
+                if left <= x < right and top <= y < bottom:
+                    now = perf_counter()
+                    if (
+                        self._last_press is not None
+                        and now - self._last_press < self.min_key_interval
+                    ):
+                        self.dropped += 1
+                        return
+                    self._last_press = now
+                    self.dungeon.press(name)
+                    return
+
+    def move_to(self, x: int, y: int):
+        pass
+
+    def frame_source(self) -> FrameSource:
+        return SimulatedFrameSource(self)
+
+    def render(self) -> Image:
+        """Whole window at the current pose; the title bar is left blank"""
+        with self._lock:
+            pose = (self.dungeon.position, self.dungeon.facing)
+            screen = self._screens.get(pose)
+            if screen is None:
+                screen = Image.new("RGB", WINDOW_SIZE, BACKGROUND_COLOR)
+                left, top = GAMEVIEW_BOX[0], GAMEVIEW_BOX[1] + SCREEN_TOP_OFFSET
+                screen.paste(self.dungeon.render_view(), (left, top))
+                for button, (left, top, _, _) in self.buttons.values():
+                    screen.paste(button, (left, top + SCREEN_TOP_OFFSET))
+                self._screens[pose] = screen
+            self.frames += 1
+            return screen
+
+    def screenshot(self, region: Tuple[int, int, int, int]) -> Image:
+        """Region (left, top, width, height) of the screen, the window is all there is"""
+        left = region[0] - self.window.topleft.x
+        top = region[1] - self.window.topleft.y
+        return self.render().crop((left, top, left + region[2], top + region[3]))
+
+
+class SimulatedFrameSource(FrameSource):
+    """Frames of a SimulatedEnvironment"""
+
+    name = "sim"
+
+    def __init__(self, environment: SimulatedEnvironment):
+        self.environment = environment
+
+    def grab(self, region: Tuple[int, int, int, int]) -> Image:
+        return self.environment.screenshot(region)
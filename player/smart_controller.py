@@ -1,26 +1,35 @@
 import ollama
 import player.schemas as schemas
 import json
+from time import perf_counter
+from typing import Iterator
 from player.types import AiTool
+from player.tool_stream import ToolStreamParser
+from player.intent import IntentResolver, IntentCache
 from llm_logger import LLMLogger
 
 
 class SmartController:
 
-    def __init__(self, video_game_name: str, model: str, logger: LLMLogger):
+    def __init__(
+        self,
+        video_game_name: str,
+        model: str,
+        logger: LLMLogger,
+        intent_cache: IntentCache = None,
+    ):
         self.model = model
         self.video_game_name = video_game_name
         self.logger = logger
-
-    def parse_action_phrase(self, user_input: str):
-        """Analyze action text and choose correct tool"""
+        # the prompt only depends on the game and the tools, build it once
         tools = [
             schemas.move_schema(),
             schemas.turn_schema(),
             schemas.lookaround_schema(),
+            schemas.goto_schema(),
             schemas.read_manual_schema(),
         ]
-        system_message = f"""
+        self.system_message = f"""
 You have access to the following functions:
 {json.dumps(tools)}
 
@@ -36,15 +45,21 @@ If a tool is found, you must respond in the JSON format matching the following s
 If there are multiple tools required, make sure a list of tools are returned in a JSON array.
 If there is no tool that match the user request, you will respond with empty json.
 Do not add any additional Notes or Explanations"""
-
-        user_message = f"""You are controlling a classic RPG videogame called {self.video_game_name} from 90s.
+        self.user_message_prefix = f"""You are controlling a classic RPG videogame called {self.video_game_name} from 90s.
 Human writes you in plain text what to do next. You are deciding which combination of tools to use to perform the action.
-User's input: {user_input}"""
+User's input: """
+        # cached answers are only valid for the same prompt
+        self.intents = IntentResolver(
+            model=model,
+            cache=intent_cache,
+            prompt=self.system_message + self.user_message_prefix,
+        )
+
+    def parse_action_phrase(self, user_input: str):
+        """Analyze action text and choose correct tool"""
         try:
-            response_text = self.execute_prompt(system_message, user_message)
-            tools_dict = json.loads(response_text)
             tools = []
-            for t in tools_dict["tools"]:
+            for t in self.intents.resolve(user_input, self._llm_tools):
                 tool = AiTool.model_validate(t)
                 tools.append(tool)
             return tools
@@ -52,12 +67,69 @@ User's input: {user_input}"""
             print(f"Failed to parse tools: {e}")
             return []
 
+    def parse_action_phrase_stream(self, user_input: str) -> Iterator[AiTool]:
+        """
+        Same as parse_action_phrase, but tools are yielded one by one while the model
+        is still generating the rest of the answer
+        """
+        try:
+            for t in self.intents.resolve_stream(user_input, self._llm_tools_stream):
+                yield AiTool.model_validate(t)
+        except Exception as e:
+            print(f"Failed to parse tools: {e}")
+
+    def _user_message(self, user_input: str) -> str:
+        return f"{self.user_message_prefix}{user_input}"
+
+    def _llm_tools(self, user_input: str) -> list:
+        """Ask the model which tools to use, returns raw tool dicts"""
+        try:
+            response_text = self.execute_prompt(
+                self.system_message, self._user_message(user_input)
+            )
+            tools_dict = json.loads(response_text)
+            for t in tools_dict["tools"]:
+                AiTool.model_validate(t)
+            return tools_dict["tools"]
+        except Exception as e:
+            print(f"Failed to parse tools: {e}")
+            return []
+
+    def _llm_tools_stream(self, user_input: str) -> Iterator[dict]:
+        """Stream the model's answer and yield raw tool dicts as they are completed"""
+        messages = [
+            {"role": "system", "content": self.system_message},
+            {"role": "user", "content": self._user_message(user_input)},
+        ]
+        parser = ToolStreamParser()
+        start = perf_counter()
+        first_tool = None
+        try:
+            for chunk in ollama.chat(model=self.model, messages=messages, stream=True):
+                for t in parser.feed(chunk["message"]["content"]):
+                    AiTool.model_validate(t)
+                    if first_tool is None:
+                        first_tool = perf_counter() - start
+                    yield t
+        finally:
+            self.logger.log_action_request(
+                prompt=messages,
+                response={
+                    "model": self.model,
+                    "message": {"role": "assistant", "content": parser.buffer},
+                    "stream": True,
+                    "first_tool_duration": first_tool,
+                },
+                duration=perf_counter() - start,
+            )
+
     def execute_prompt(self, system_message: str, user_message: str) -> str:
         """Execute the prompt on ollama engine"""
         messages = [
             {"role": "system", "content": system_message},
             {"role": "user", "content": user_message},
         ]
+        start = perf_counter()
         response = ollama.chat(
             model=self.model,
             messages=messages,
@@ -65,5 +137,6 @@ User's input: {user_input}"""
         self.logger.log_action_request(
             prompt=messages,
             response=response,
+            duration=perf_counter() - start,
         )
         return response["message"]["content"]
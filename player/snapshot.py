@@ -0,0 +1,95 @@
+import struct
+import zlib
+import numpy as np
+from typing import Tuple
+from player.gridmap import GridMap
+from player.history import ActionHistory
+from player.state import PlayerState
+from player.types import GlobalDirection
+from player.vision import SEGMENT_DTYPE, SegmentationResult
+
+SNAPSHOT_MAGIC = b"DMPS"
+# bump when the layout below changes, older snapshots are refused
+SNAPSHOT_VERSION = 1
+# magic, version, step, x, y, direction
+HEADER = struct.Struct("<4sHIiiB")
+# segment count
+SEGMENTS = struct.Struct("<I")
+# origin x, origin y, rows, cols
+MAP = struct.Struct("<iiII")
+# depth, kept actions, total actions
+HISTORY = struct.Struct("<IIQ")
+# the map is mostly unknown cells, fast compression is enough
+COMPRESS_LEVEL = 1
+
+
+def dump_snapshot(state: PlayerState, history: ActionHistory) -> bytes:
+    """
+    Binary snapshot of the player state and action history: a fixed header followed
+    by the zlib compressed raw arrays of segments, map grid and history.
+    """
+    segments = np.ascontiguousarray(state.segments.segments, dtype=SEGMENT_DTYPE)
+    grid = np.ascontiguousarray(state.map.grid, dtype=np.int8)
+    codes = history.ordered()
+    body = b"".join(
+        (
+            SEGMENTS.pack(len(segments)),
+            segments.tobytes(),
+            MAP.pack(state.map.origin[0], state.map.origin[1], *grid.shape),
+            grid.tobytes(),
+            HISTORY.pack(history.depth, len(codes), history.total),
+            codes.tobytes(),
+        )
+    )
+    header = HEADER.pack(
+        SNAPSHOT_MAGIC,
+        SNAPSHOT_VERSION,
+        state.step,
+        state.coordinates[0],
+        state.coordinates[1],
+        state.direction.value,
+    )
+    return header + zlib.compress(body, COMPRESS_LEVEL)
+
+
+def load_snapshot(data: bytes, depth: int = None) -> Tuple[PlayerState, ActionHistory]:
+    """
+    Player state and action history of a dump_snapshot() snapshot. depth overrides
+    the saved history depth, keeping the latest actions.
+    """
+    magic, version, step, x, y, direction = HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("Not a player snapshot")
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}")
+    body = zlib.decompress(data[HEADER.size :])
+
+    (count,) = SEGMENTS.unpack_from(body)
+    offset = SEGMENTS.size
+    segments = np.frombuffer(
+        body, dtype=SEGMENT_DTYPE, count=count, offset=offset
+    ).copy()
+    offset += segments.nbytes
+
+    origin_x, origin_y, rows, cols = MAP.unpack_from(body, offset)
+    offset += MAP.size
+    grid = np.frombuffer(body, dtype=np.int8, count=rows * cols, offset=offset)
+    grid = grid.reshape(rows, cols).copy()
+    offset += grid.nbytes
+
+    saved_depth, size, total = HISTORY.unpack_from(body, offset)
+    offset += HISTORY.size
+    codes = np.frombuffer(body, dtype=np.uint8, count=size * 2, offset=offset).reshape(
+        size, 2
+    )
+
+    state = PlayerState(
+        step=step,
+        segments=SegmentationResult(segments),
+        coordinates=(x, y),
+        direction=GlobalDirection(direction),
+        map=GridMap(grid, (origin_x, origin_y)),
+    )
+    return state, ActionHistory.from_codes(
+        codes, saved_depth if depth is None else depth, total
+    )
@@ -1,12 +1,42 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field, field_serializer, field_validator
 from PIL import Image
 from typing import List, Tuple
-from player.vision import VisionRectangle
+from player.vision import VisionRectangle, SegmentationResult
 from player.types import GlobalDirection
+from player.gridmap import GridMap
 
 
 class PlayerState(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     step: int = 0
-    segments: List[VisionRectangle] = []  # segments (items) seen of the screen
+    # segments (items) seen of the screen
+    segments: SegmentationResult = Field(default_factory=SegmentationResult.empty)
     coordinates: Tuple[int, int] = (0, 0)
     direction: GlobalDirection = GlobalDirection.NORTH
+    # explored cells around the start at (0, 0)
+    map: GridMap = Field(default_factory=GridMap)
+
+    @field_validator("segments", mode="before")
+    @classmethod
+    def _segments_from_list(cls, value):
+        if isinstance(value, list):
+            return SegmentationResult.from_rectangles(
+                [VisionRectangle.model_validate(r) for r in value]
+            )
+        return value
+
+    @field_serializer("segments")
+    def _segments_to_list(self, segments: SegmentationResult) -> List[dict]:
+        return [r.model_dump() for r in segments.to_rectangles()]
+
+    @field_validator("map", mode="before")
+    @classmethod
+    def _map_from_dict(cls, value):
+        if isinstance(value, dict):
+            return GridMap.from_dict(value)
+        return value
+
+    @field_serializer("map")
+    def _map_to_dict(self, grid_map: GridMap) -> dict:
+        return grid_map.to_dict()
@@ -0,0 +1,66 @@
+import json
+import re
+from typing import List
+
+TOOLS_START = re.compile(r'"tools"\s*:\s*\[')
+
+
+class ToolStreamParser:
+    """
+    Incremental parser for the {"tools": [...]} answer of the model.
+    Feed it text as it is generated; every entry of the "tools" array is returned
+    as soon as its closing brace arrives.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0  # next character to look at
+        self.in_array = False
+        self.finished = False
+        self._start = -1  # start of the current object
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text: str) -> List[dict]:
+        """Add generated text and return the tools completed by it"""
+        self.buffer += text
+        tools = []
+        if self.finished:
+            return tools
+        if not self.in_array:
+            match = TOOLS_START.search(self.buffer)
+            if match is None:
+                return tools
+            self.in_array = True
+            self.position = match.end()
+        buffer = self.buffer
+        i = self.position
+        while i < len(buffer):
+            c = buffer[i]
+            if self._depth == 0:
+                if c == "{":
+                    self._start = i
+                    self._depth = 1
+                elif c == "]":
+                    self.finished = True
+                    i += 1
+                    break
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c == "{" or c == "[":
+                self._depth += 1
+            elif c == "}" or c == "]":
+                self._depth -= 1
+                if self._depth == 0:
+                    tools.append(json.loads(buffer[self._start : i + 1]))
+            i += 1
+        self.position = i
+        return tools
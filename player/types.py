@@ -33,6 +33,8 @@ class EAction(Enum):
 
 
 class Action:
+    __slots__ = ("action", "args")
+
     action: EAction
     args: any
 
@@ -1,12 +1,13 @@
 from PIL import Image
 from pydantic import BaseModel
-from typing import Tuple
+from typing import Dict, List, Tuple
 import base64
 import cv2
 import numpy as np
 from io import BytesIO
 from openai import OpenAI
 from llm_logger import LLMLogger
+from player.segment_cache import SegmentationCache
 
 
 class VisionRectangle(BaseModel):
@@ -17,14 +18,133 @@ class VisionRectangle(BaseModel):
     color: Tuple[int, int, int]
 
 
+# Bump when the segmentation output changes to invalidate cached results
+SEGMENTATION_VERSION = 2
+MIN_SEGMENT_AREA = 500
+SEGMENT_COLOR = (255, 0, 0)
+SEGMENT_DTYPE = np.dtype(
+    [
+        ("x", np.int32),
+        ("y", np.int32),
+        ("width", np.int32),
+        ("height", np.int32),
+        ("color", np.uint8, (3,)),
+        ("area", np.int32),  # area of the bounding box
+        ("cx", np.float32),  # center of the bounding box
+        ("cy", np.float32),
+    ]
+)
+
+
+class SegmentationResult:
+    """
+    Segments found on the gameview, stored as a numpy structured array (SEGMENT_DTYPE).
+    The overlay image and the pydantic rectangles are only built when asked for.
+    """
+
+    __slots__ = ("segments", "image", "_overlay")
+
+    def __init__(self, segments: np.ndarray, image: np.ndarray = None):
+        self.segments = segments
+        self.image = image
+        self._overlay = None
+
+    @classmethod
+    def empty(cls) -> "SegmentationResult":
+        return cls(np.empty(0, dtype=SEGMENT_DTYPE))
+
+    @classmethod
+    def from_rectangles(cls, rectangles: List[VisionRectangle]) -> "SegmentationResult":
+        segments = np.empty(len(rectangles), dtype=SEGMENT_DTYPE)
+        for i, r in enumerate(rectangles):
+            segments[i] = (
+                r.x,
+                r.y,
+                r.width,
+                r.height,
+                r.color,
+                r.width * r.height,
+                r.x + r.width / 2,
+                r.y + r.height / 2,
+            )
+        return cls(segments)
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    @property
+    def overlay(self) -> Image:
+        """Gameview with the segments drawn on it, rendered on first access"""
+        if self._overlay is None and self.image is not None:
+            canvas = self.image.copy()
+            for s in self.segments:
+                cv2.rectangle(
+                    canvas,
+                    (int(s["x"]), int(s["y"])),
+                    (int(s["x"] + s["width"]), int(s["y"] + s["height"])),
+                    tuple(int(c) for c in s["color"]),
+                    2,
+                )
+            self._overlay = Image.fromarray(canvas)
+        return self._overlay
+
+    def to_rectangles(self) -> List[VisionRectangle]:
+        return [
+            VisionRectangle(
+                x=int(s["x"]),
+                y=int(s["y"]),
+                width=int(s["width"]),
+                height=int(s["height"]),
+                color=tuple(int(c) for c in s["color"]),
+            )
+            for s in self.segments
+        ]
+
+    def to_columns(self) -> Dict[str, np.ndarray]:
+        """One-dimensional columns of the segments for tables, color split into r, g, b"""
+        columns = {}
+        for name in SEGMENT_DTYPE.names:
+            if name == "color":
+                for i, channel in enumerate("rgb"):
+                    columns[channel] = self.segments["color"][:, i]
+            else:
+                columns[name] = self.segments[name]
+        return columns
+
+    def __getstate__(self):
+        return (self.segments, self.image)
+
+    def __setstate__(self, state):
+        self.segments, self.image = state
+        self._overlay = None
+
+
 class VisionModel:
-    def __init__(self, video_game_name: str, logger: LLMLogger):
+    def __init__(
+        self,
+        video_game_name: str,
+        logger: LLMLogger,
+        cache: SegmentationCache = None,
+    ):
         self.video_game_name = video_game_name
         self.logger = logger
+        self.cache = cache
 
-    def segment_gameview(self, image: Image) -> dict:
+    def segment_gameview(self, image: Image) -> SegmentationResult:
         # Convert the PIL image to a numpy array
         cv2_image = np.array(image)
+        if self.cache is None:
+            return self._segment(cv2_image)
+        key = f"v{SEGMENTATION_VERSION}-{SegmentationCache.key(cv2_image)}"
+        segments = self.cache.get(key)
+        if segments is not None:
+            # the key is the content hash, so this frame equals the cached one
+            return SegmentationResult(segments, cv2_image)
+        result = self._segment(cv2_image)
+        self.cache.put(key, result.segments)
+        return result
+
+    def _segment(self, cv2_image: np.ndarray) -> SegmentationResult:
         gray = cv2.cvtColor(cv2_image, cv2.COLOR_BGR2GRAY)
         _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
         kernel = np.ones((4, 4), np.uint8)
@@ -33,29 +153,23 @@ class VisionModel:
         contours, hierarchy = cv2.findContours(
             sure_bg, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE
         )
-        rectangles = []
-        for idx, c in enumerate(contours):
-            if hierarchy[0][idx][3] != -1:
-                continue
-            boundRect = cv2.boundingRect(c)
-            if boundRect[2] * boundRect[3] < 500:
-                continue
-            rect = VisionRectangle(
-                x=boundRect[0],
-                y=boundRect[1],
-                width=boundRect[2],
-                height=boundRect[3],
-                color=(255, 0, 0),
-            )
-            rectangles.append(rect)
-            cv2.rectangle(
-                cv2_image,
-                (rect.x, rect.y),
-                (rect.x + rect.width, rect.y + rect.height),
-                rect.color,
-                2,
-            )
-        return (Image.fromarray(cv2_image), rectangles)
+        if hierarchy is None:
+            return SegmentationResult(np.empty(0, dtype=SEGMENT_DTYPE), cv2_image)
+        top_level = np.flatnonzero(hierarchy[0][:, 3] == -1)
+        boxes = np.array(
+            [cv2.boundingRect(contours[idx]) for idx in top_level], dtype=np.int32
+        ).reshape(-1, 4)
+        boxes = boxes[boxes[:, 2] * boxes[:, 3] >= MIN_SEGMENT_AREA]
+        segments = np.empty(len(boxes), dtype=SEGMENT_DTYPE)
+        segments["x"] = boxes[:, 0]
+        segments["y"] = boxes[:, 1]
+        segments["width"] = boxes[:, 2]
+        segments["height"] = boxes[:, 3]
+        segments["color"] = SEGMENT_COLOR
+        segments["area"] = boxes[:, 2] * boxes[:, 3]
+        segments["cx"] = boxes[:, 0] + boxes[:, 2] / 2
+        segments["cy"] = boxes[:, 1] + boxes[:, 3] / 2
+        return SegmentationResult(segments, cv2_image)
 
     # def analyze_gameview(
     #     screen: Image, openai: OpenAI, step: int, video_game_name: str